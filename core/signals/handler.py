@@ -1,7 +1,9 @@
-from django.dispatch import receiver
-from store.signals import order_created
+import logging
+from store import outbox
 
+logger = logging.getLogger(__name__)
 
-@receiver(order_created)
-def on_order_created(sender, **kwargs):
-    print(kwargs["order"])
+
+@outbox.handler("order_created")
+def on_order_created(payload):
+    logger.info("Order %s created", payload["order_id"])
@@ -3,8 +3,9 @@ from django.db.models import Count
 from django.utils.html import format_html
 from django.utils.http import urlencode
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.contenttypes.admin import GenericStackedInline
-from store import models
+from store import models, cache, flashsale, orders, outbox
 from tags import models as tags_models
 
 
@@ -24,9 +25,6 @@ class CollectionAdmin(admin.ModelAdmin):
         )
         return format_html("<a href='{}'>{}</a>", url, collection.product_count)
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(product_count=Count("product"))
-
 
 class TagsInline(GenericStackedInline):
     model = tags_models.TaggedItem
@@ -53,7 +51,9 @@ class Product(admin.ModelAdmin):
         "last_update",
         "inventory",
         "status",
+        "flash_sale",
     ]
+    list_filter = ["flash_sale"]
     search_fields = ["title"]
     exclude = ["promotions"]
     ordering = ["id"]
@@ -69,7 +69,10 @@ class Product(admin.ModelAdmin):
 
     @admin.action(description="Clear Inventory")
     def clear_inventory(self, request, queryset):
+        product_ids = list(queryset.values_list("pk", flat=True))
         update_count = queryset.update(inventory=0)
+        cache.bump(models.Product)
+        flashsale.reset(*product_ids)
         self.message_user(
             request, f"{update_count} Items have been cleared", messages.SUCCESS
         )
@@ -138,6 +141,8 @@ class OrderAdmin(admin.ModelAdmin):
         "customer",
         "placed_at",
         "payment_status",
+        "item_count",
+        "total",
     ]
     list_filter = ["payment_status"]
     autocomplete_fields = ["customer"]
@@ -145,6 +150,10 @@ class OrderAdmin(admin.ModelAdmin):
     inlines = [OrderItemInline]
     list_per_page = 50
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        orders.refresh([form.instance.pk])
+
 
 @admin.register(models.Review)
 class ReviewAdmin(admin.ModelAdmin):
@@ -155,7 +164,7 @@ class ReviewAdmin(admin.ModelAdmin):
 
 @admin.register(models.Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ["id", "created_at"]
+    list_display = ["id", "created_at", "last_activity"]
     ordering = ["created_at"]
 
 
@@ -164,3 +173,20 @@ class ProductImageAdmin(admin.ModelAdmin):
     list_display = ["id", "image", "product"]
     ordering = ["id"]
     search_fields = ["product"]
+
+
+@admin.register(models.OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ["id", "topic", "handler", "status", "attempts", "created_at"]
+    list_filter = ["status", "topic"]
+    ordering = ["-id"]
+    actions = ["retry"]
+
+    @admin.action(description="Retry selected events")
+    def retry(self, request, queryset):
+        update_count = queryset.exclude(status=outbox.DONE).update(
+            status=outbox.PENDING, attempts=0, available_at=timezone.now()
+        )
+        self.message_user(
+            request, f"{update_count} events have been queued again", messages.SUCCESS
+        )
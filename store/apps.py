@@ -5,4 +5,5 @@ class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
     def ready(self) -> None:
+        import store.checks
         import store.signals.handlers
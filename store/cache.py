@@ -0,0 +1,202 @@
+import json
+from datetime import datetime, timezone
+from hashlib import md5
+from time import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+HITS_KEY = "store:cache:hits"
+MISSES_KEY = "store:cache:misses"
+
+PROCESS_LOCAL_BACKENDS = [
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+]
+
+
+def is_shared():
+    """Whether every worker sees the same cache, see the store.W001 check"""
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_BACKENDS
+
+
+def generation_key(model):
+    return f"store:generation:{model._meta.label_lower}"
+
+
+def written_key(model):
+    return f"store:written:{model._meta.label_lower}"
+
+
+def bump(model):
+    """Invalidate every cached response built from ``model`` in O(1)
+
+    Waits for the current transaction to commit, a read between the write
+    and the commit would otherwise cache the old rows under the new
+    generation.
+    """
+    key = generation_key(model)
+
+    def increment():
+        # Start from a timestamp so an evicted counter never goes backwards
+        count(key, start=int(time() * 1000))
+        cache.set(written_key(model), time(), timeout=None)
+
+    transaction.on_commit(increment)
+
+
+def get_or_start(keys, start):
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, start, timeout=None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def generations(models):
+    # Start from a timestamp so an evicted counter never goes backwards
+    return get_or_start([generation_key(model) for model in models], int(time() * 1000))
+
+
+def last_written(models):
+    """When a write to any of ``models`` last committed, now if unknown"""
+    timestamps = get_or_start([written_key(model) for model in models], time())
+    return datetime.fromtimestamp(max(timestamps), timezone.utc)
+
+
+def count(key, start=1):
+    """Increment the counter at ``key``, setting it to ``start`` when missing"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, start, timeout=None)
+
+
+def stats():
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {"hits": values.get(HITS_KEY, 0), "misses": values.get(MISSES_KEY, 0)}
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+class CachedResponseMixin:
+    """Read-through cache for list and retrieve
+
+    Keys are made from the view, its URL kwargs and query parameters plus the
+    generation counters of ``cache_models``, which signal handlers bump on
+    every write, so stale entries are never read and simply expire.
+    """
+
+    cache_models = []
+    cache_timeout = 60 * 15
+
+    def get_cache_key(self, request):
+        raw = json.dumps(
+            [
+                self.basename,
+                self.action,
+                self.kwargs,
+                request.get_host(),
+                sorted(request.query_params.lists()),
+                generations(self.cache_models),
+            ],
+            default=str,
+        )
+        return "store:response:" + md5(raw.encode()).hexdigest()
+
+    def cached(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            count(HITS_KEY)
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        count(MISSES_KEY)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.cache_timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """Strong ETag and Last-Modified for list and retrieve
+
+    With a shared cache, lists are validated by the generation counters and
+    write times of ``cache_models``, the cache reads CachedResponseMixin does
+    anyway, so no query runs before a 304. Otherwise, and for retrieve, the
+    validators come from one aggregate over the (filtered) queryset,
+    ``COUNT(*)`` plus ``MAX()`` of ``last_modified_fields``. Either way a
+    matching ``If-None-Match``/``If-Modified-Since`` skips serializing.
+    """
+
+    last_modified_fields = ["last_update"]
+
+    def get_validator_queryset(self):
+        if self.action == "list":
+            return self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return self.get_queryset().filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+
+    def get_validators(self):
+        if self.action == "list" and is_shared():
+            state = {"generations": generations(self.cache_models)}
+            return state, last_written(self.cache_models)
+        aggregates = {
+            f"max_{index}": Max(field)
+            for index, field in enumerate(self.last_modified_fields)
+        }
+        state = self.get_validator_queryset().aggregate(count=Count("pk"), **aggregates)
+        timestamps = [state[name] for name in aggregates if state[name]]
+        return state, max(timestamps, default=None)
+
+    def conditional(self, handler, request, *args, **kwargs):
+        state, last_modified = self.get_validators()
+        if self.action != "list" and not state["count"]:
+            return handler(request, *args, **kwargs)
+
+        raw = json.dumps(
+            [
+                self.action,
+                self.kwargs,
+                request.get_host(),
+                request.accepted_renderer.format,
+                sorted(request.query_params.lists()),
+                sorted(state.items()),
+            ],
+            default=str,
+        )
+        etag = quote_etag(md5(raw.encode()).hexdigest())
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if timestamp:
+                response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,434 @@
+"""Cart storage behind CartViewSet, CartItemViewSet and checkout
+
+Both storages hand out Cart and CartItem model instances; a cart's items
+are on ``cart.cart_items`` with their product loaded, and carts and items
+carry ``total_price`` (computed in SQL by the database storage). DatabaseCartStorage
+keeps them in the Cart/CartItem tables, KeyValueCartStorage keeps each
+cart as one hash in a Redis-like store so that nothing reaches the
+relational tables before checkout writes the order. Select one with::
+
+    CART_STORAGE = {
+        "BACKEND": "store.carts.KeyValueCartStorage",
+        "OPTIONS": {"client": "redis.Redis.from_url", "location": "redis://..."},
+    }
+"""
+
+import threading
+from decimal import Decimal
+import time
+from functools import lru_cache
+from uuid import UUID, uuid4
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Prefetch, Sum
+from django.db.models.functions import Coalesce
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+from store import models, pricing, upserts
+
+DEFAULT_STORAGE = "store.carts.DatabaseCartStorage"
+DEFAULT_TTL = 60 * 60 * 24 * 7
+
+
+class CartNotFound(Exception):
+    pass
+
+
+class UnknownProducts(Exception):
+    def __init__(self, product_ids):
+        super().__init__(product_ids)
+        self.product_ids = product_ids
+
+
+class DatabaseCartStorage:
+    def items_queryset(self):
+        return (
+            models.CartItem.objects.select_related("product")
+            .annotate(total_price=pricing.line_total())
+            .order_by("pk")
+        )
+
+    def create(self):
+        cart = models.Cart.objects.create()
+        cart.cart_items = []
+        cart.total_price = Decimal(0)
+        return cart
+
+    def get(self, cart_id):
+        try:
+            return (
+                models.Cart.objects.annotate(
+                    total_price=pricing.total("items__quantity", "items__product")
+                )
+                .prefetch_related(
+                    Prefetch("items", self.items_queryset(), to_attr="cart_items")
+                )
+                .filter(pk=cart_id)
+                .first()
+            )
+        except ValidationError:
+            return None
+
+    def summary(self, cart_id):
+        """``{"id", "count", "total_price"}`` in one aggregate, None without a cart"""
+        try:
+            return (
+                models.Cart.objects.filter(pk=cart_id)
+                .annotate(
+                    count=Coalesce(Sum("items__quantity"), 0),
+                    total_price=pricing.total("items__quantity", "items__product"),
+                )
+                .values("id", "count", "total_price")
+                .first()
+            )
+        except ValidationError:
+            return None
+
+    def delete(self, cart_id):
+        try:
+            return models.Cart.objects.filter(pk=cart_id).delete()[0] > 0
+        except ValidationError:
+            return False
+
+    def items(self, cart_id):
+        try:
+            return list(self.items_queryset().filter(cart_id=cart_id))
+        except ValidationError:
+            return []
+
+    def get_item(self, cart_id, item_id):
+        try:
+            return self.items_queryset().filter(cart_id=cart_id, pk=item_id).first()
+        except (ValidationError, ValueError):
+            return None
+
+    def touch(self, cart_id):
+        """Mark the cart active, False when it does not exist"""
+        return (
+            models.Cart.objects.filter(pk=cart_id).update(last_activity=timezone.now())
+            > 0
+        )
+
+    @transaction.atomic
+    def add_items(self, cart_id, quantities):
+        """Add ``{product_id: quantity}`` to the cart in one upsert statement
+
+        Touching the cart first checks it exists and holds its row against
+        the reaper; rows for unknown products are filtered out by a join, so
+        a short result means some were missing.
+        """
+        try:
+            cart_id = models.Cart._meta.pk.to_python(cart_id)
+        except ValidationError:
+            raise CartNotFound(cart_id)
+        if not self.touch(cart_id):
+            raise CartNotFound(cart_id)
+
+        rows = self.upsert(cart_id, quantities)
+        if len(rows) < len(quantities):
+            raise UnknownProducts(sorted(quantities.keys() - {row[1] for row in rows}))
+        return [
+            models.CartItem(id=pk, cart_id=cart_id, product_id=product_id, quantity=n)
+            for pk, product_id, n in rows
+        ]
+
+    def upsert(self, cart_id, quantities):
+        if not quantities:
+            return []
+        cart = models.Cart._meta.pk.get_db_prep_value(cart_id, connection)
+        rows = upserts.add(
+            "store_cartitem",
+            ["cart_id", "product_id"],
+            "quantity",
+            [(cart, product_id, n) for product_id, n in quantities.items()],
+            joins=[
+                "JOIN store_product product ON product.id = source.product_id",
+                "JOIN store_cart cart ON cart.id = source.cart_id",
+            ],
+            returning=["id", "product_id", "quantity"],
+        )
+        if rows is not None:
+            return rows
+
+        return list(
+            models.CartItem.objects.filter(
+                cart_id=cart_id, product_id__in=quantities
+            ).values_list("id", "product_id", "quantity")
+        )
+
+    @transaction.atomic
+    def update_item(self, item, quantity):
+        self.touch(item.cart_id)
+        item.quantity = quantity
+        item.save()
+        item.total_price = quantity * pricing.unit_price(item.product)
+        return item
+
+    @transaction.atomic
+    def delete_item(self, item):
+        self.touch(item.cart_id)
+        item.delete()
+
+    def checked_out(self, cart_id):
+        # inside the checkout transaction, the cart goes if the order commits
+        self.delete(cart_id)
+
+
+class KeyValueCartStorage:
+    """Each cart is a hash ``cart:<id>`` holding ``created_at`` and one
+    ``<product_id>: quantity`` field per item, the product id doubles as
+    the item id. Every write pushes the expiry back by ``timeout`` seconds,
+    CART_TTL by default, so the store reaps idle carts by itself.
+    """
+
+    def __init__(self, client, location=None, timeout=None):
+        factory = import_string(client)
+        self.client = factory(location) if location else factory()
+        self.timeout = timeout or get_ttl()
+
+    def key(self, cart_id):
+        return f"cart:{UUID(str(cart_id))}"
+
+    def touch(self, key):
+        self.client.expire(key, self.timeout)
+
+    def create(self):
+        cart = models.Cart(id=uuid4(), created_at=timezone.now())
+        key = self.key(cart.id)
+        self.client.hset(key, mapping={"created_at": cart.created_at.isoformat()})
+        self.touch(key)
+        cart.cart_items = []
+        cart.total_price = Decimal(0)
+        return cart
+
+    def load(self, cart_id):
+        try:
+            key = self.key(cart_id)
+        except ValueError:
+            return None, {}
+        fields = {text(k): text(v) for k, v in self.client.hgetall(key).items()}
+        if "created_at" not in fields:
+            return None, {}
+        created_at = parse_datetime(fields.pop("created_at"))
+        cart = models.Cart(id=UUID(str(cart_id)), created_at=created_at)
+        return cart, {int(k): int(v) for k, v in fields.items()}
+
+    def build_items(self, cart_id, quantities):
+        products = models.Product.objects.only(
+            "id", "title", "price", "effective_price", "flash_sale"
+        ).in_bulk(quantities)
+        items = []
+        for product_id, quantity in sorted(quantities.items()):
+            if product_id in products:
+                item = models.CartItem(
+                    id=product_id,
+                    cart_id=cart_id,
+                    product=products[product_id],
+                    quantity=quantity,
+                )
+                item.total_price = quantity * pricing.unit_price(item.product)
+                items.append(item)
+        return items
+
+    def get(self, cart_id):
+        cart, quantities = self.load(cart_id)
+        if cart is not None:
+            cart.cart_items = self.build_items(cart.id, quantities)
+            cart.total_price = sum(
+                (item.total_price for item in cart.cart_items), Decimal(0)
+            )
+        return cart
+
+    def summary(self, cart_id):
+        cart = self.get(cart_id)
+        if cart is None:
+            return None
+        return {
+            "id": cart.id,
+            "count": sum(item.quantity for item in cart.cart_items),
+            "total_price": cart.total_price,
+        }
+
+    def delete(self, cart_id):
+        try:
+            return self.client.delete(self.key(cart_id)) > 0
+        except ValueError:
+            return False
+
+    def items(self, cart_id):
+        cart, quantities = self.load(cart_id)
+        return [] if cart is None else self.build_items(cart.id, quantities)
+
+    def get_item(self, cart_id, item_id):
+        try:
+            product_id = int(item_id)
+        except ValueError:
+            return None
+        cart, quantities = self.load(cart_id)
+        if cart is None or product_id not in quantities:
+            return None
+        items = self.build_items(cart.id, {product_id: quantities[product_id]})
+        return items[0] if items else None
+
+    def add_items(self, cart_id, quantities):
+        try:
+            key = self.key(cart_id)
+        except ValueError:
+            raise CartNotFound(cart_id)
+        if not self.client.exists(key):
+            raise CartNotFound(cart_id)
+        known = set(
+            models.Product.objects.filter(pk__in=quantities).values_list(
+                "pk", flat=True
+            )
+        )
+        if len(known) < len(quantities):
+            raise UnknownProducts(sorted(quantities.keys() - known))
+
+        totals = {
+            product_id: self.client.hincrby(key, str(product_id), quantity)
+            for product_id, quantity in quantities.items()
+        }
+        self.touch(key)
+        return self.build_items(UUID(str(cart_id)), totals)
+
+    def update_item(self, item, quantity):
+        key = self.key(item.cart_id)
+        self.client.hset(key, str(item.product_id), quantity)
+        self.touch(key)
+        item.quantity = quantity
+        item.total_price = quantity * pricing.unit_price(item.product)
+        return item
+
+    def delete_item(self, item):
+        self.client.hdel(self.key(item.cart_id), str(item.product_id))
+
+    def checked_out(self, cart_id):
+        # the store is not transactional, keep the cart until the order commits
+        transaction.on_commit(lambda: self.delete(cart_id))
+
+
+class LocalKeyValueStore:
+    """In-process stand-in for the Redis hash commands used above
+
+    Only shared by the threads of one process, use it for development and
+    tests.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+
+    def _get(self, key):
+        if key in self.expires and self.expires[key] <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def exists(self, key):
+        with self.lock:
+            return int(self._get(key) is not None)
+
+    def hgetall(self, key):
+        with self.lock:
+            return dict(self._get(key) or {})
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self.lock:
+            fields = self.data.setdefault(key, self._get(key) or {})
+            values = dict(mapping or {})
+            if field is not None:
+                values[field] = value
+            added = len(values.keys() - fields.keys())
+            fields.update({field: str(value) for field, value in values.items()})
+            return added
+
+    def hincrby(self, key, field, amount=1):
+        with self.lock:
+            fields = self.data.setdefault(key, self._get(key) or {})
+            fields[field] = str(int(fields.get(field, 0)) + amount)
+            return int(fields[field])
+
+    def hdel(self, key, *fields):
+        with self.lock:
+            values = self._get(key) or {}
+            return sum(values.pop(field, None) is not None for field in fields)
+
+    def expire(self, key, seconds):
+        with self.lock:
+            if self._get(key) is None:
+                return False
+            self.expires[key] = time.monotonic() + seconds
+            return True
+
+    def delete(self, *keys):
+        with self.lock:
+            deleted = 0
+            for key in keys:
+                deleted += self._get(key) is not None
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return deleted
+
+
+def text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def get_ttl():
+    """Seconds a cart may stay idle before it expires"""
+    return getattr(settings, "CART_TTL", DEFAULT_TTL)
+
+
+def delete_expired(before, batch_size=500, after=None):
+    """Delete one batch of database carts idle since ``before``
+
+    Takes the next ``batch_size`` expired carts after primary key ``after``
+    in key order, locking them so that a concurrent item write either
+    lands first (and the cart is kept) or waits until the cart is gone.
+    Items and carts are removed with plain DELETE statements, no model
+    instances are loaded. Returns the ids deleted, empty when done.
+    """
+    with transaction.atomic():
+        carts = models.Cart.objects.select_for_update(skip_locked=True).filter(
+            last_activity__lt=before
+        )
+        if after is not None:
+            carts = carts.filter(pk__gt=after)
+        ids = list(carts.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return ids
+
+        pk = models.Cart._meta.pk
+        params = [pk.get_db_prep_value(cart_id, connection) for cart_id in ids]
+        placeholders = ", ".join(["%s"] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {models.CartItem._meta.db_table} "
+                f"WHERE cart_id IN ({placeholders})",
+                params,
+            )
+            cursor.execute(
+                f"DELETE FROM {models.Cart._meta.db_table} "
+                f"WHERE id IN ({placeholders})",
+                params,
+            )
+    return ids
+
+
+@lru_cache(maxsize=None)
+def get_storage():
+    config = getattr(settings, "CART_STORAGE", {})
+    backend = import_string(config.get("BACKEND", DEFAULT_STORAGE))
+    return backend(**config.get("OPTIONS", {}))
+
+
+@receiver(setting_changed)
+def reset_storage(setting, **kwargs):
+    if setting == "CART_STORAGE":
+        get_storage.cache_clear()
@@ -0,0 +1,69 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+
+FIELDS = [
+    "id",
+    "slug",
+    "title",
+    "description",
+    "price",
+    "inventory",
+    "collection",
+    "promotions",
+]
+FORMATS = ["csv", "jsonl"]
+
+
+def guess_format(path, default="csv"):
+    for name in FORMATS:
+        if path.endswith(f".{name}"):
+            return name
+    return default
+
+
+def read_records(stream, format):
+    """Yield one raw record per product, a dict for CSV and a line for JSONL
+
+    Nothing is parsed here so that one bad row can't stop the stream, pass
+    each record to ``parse_record``.
+    """
+    if format == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield line
+
+
+def parse_record(record, format):
+    """The record as a dict with ``promotions`` as a list of ids (or None),
+    raises ValueError or TypeError for malformed input"""
+    if format != "csv":
+        record = json.loads(record)
+        if not isinstance(record, dict):
+            raise ValueError("expected a JSON object")
+    promotions = record.get("promotions")
+    if isinstance(promotions, str):
+        promotions = [value for value in promotions.split(";") if value]
+    if promotions is not None:
+        record["promotions"] = [int(value) for value in promotions]
+    return record
+
+
+class RecordWriter:
+    def __init__(self, stream, format):
+        self.stream = stream
+        self.format = format
+        if format == "csv":
+            self.writer = csv.DictWriter(stream, FIELDS)
+            self.writer.writeheader()
+
+    def write(self, record):
+        if self.format == "csv":
+            record = dict(
+                record, promotions=";".join(str(pk) for pk in record["promotions"])
+            )
+            self.writer.writerow(record)
+        else:
+            self.stream.write(json.dumps(record, cls=DjangoJSONEncoder) + "\n")
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+from store import cache
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Cache generations and flash-sale pools must be seen by every worker"""
+    if cache.is_shared():
+        return []
+    backend = settings.CACHES["default"]["BACKEND"]
+    return [
+        Warning(
+            f"The default cache ({backend}) is not shared between processes.",
+            hint="Writes only invalidate the cached catalog of the worker that "
+            "made them and every worker keeps its own flash-sale pools. Point "
+            "CACHES['default'] at Redis or Memcached.",
+            obj="CACHES",
+            id="store.W001",
+        )
+    ]
@@ -0,0 +1,9 @@
+from django.conf import settings
+
+
+def get_setting(group, defaults, name):
+    """``settings.<group>[name]``, falling back to ``defaults[name]``
+
+    Modules bind their group with functools.partial, see store.outbox.
+    """
+    return {**defaults, **getattr(settings, group, {})}[name]
@@ -0,0 +1,66 @@
+import re
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework.utils.encoders import JSONEncoder
+from store import serializers
+
+accepts_gzip = re.compile(r"\bgzip\b")
+
+
+def product_chunks(request, queryset, chunk_size):
+    """Yield lists of product dicts shaped like the products endpoint"""
+    serializer = serializers.ProductReadSerializer(context={"request": request})
+    rows = serializers.ProductReadSerializer.rows(queryset).iterator(
+        chunk_size=chunk_size
+    )
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield build_chunk(serializer, chunk)
+            chunk = []
+    if chunk:
+        yield build_chunk(serializer, chunk)
+
+
+def build_chunk(serializer, rows):
+    images = serializer.fetch_images([row["id"] for row in rows])
+    return [serializer.build(row, images) for row in rows]
+
+
+def ndjson(chunks, encoder):
+    for chunk in chunks:
+        yield "".join(encoder.encode(product) + "\n" for product in chunk)
+
+
+def json_array(chunks, encoder):
+    yield "["
+    separator = ""
+    for chunk in chunks:
+        yield separator + ",".join(encoder.encode(product) for product in chunk)
+        separator = ","
+    yield "]"
+
+
+def product_feed(request, queryset, array=False, chunk_size=1000):
+    """Stream ``queryset`` from a server-side cursor in constant memory
+
+    One string is yielded per chunk of products so that gzip sees large
+    blocks; the body is compressed here when the client accepts gzip.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    chunks = product_chunks(request, queryset, chunk_size)
+    if array:
+        content, content_type = json_array(chunks, encoder), "application/json"
+    else:
+        content, content_type = ndjson(chunks, encoder), "application/x-ndjson"
+
+    content = (part.encode() for part in content)
+    response = StreamingHttpResponse(content_type=content_type)
+    if accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+        content = compress_sequence(content)
+        response["Content-Encoding"] = "gzip"
+    response.streaming_content = content
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
@@ -1,5 +1,10 @@
+from decimal import Decimal, InvalidOperation
+from django.db.models import Count, Q
+from django_filters import utils
 from django_filters.rest_framework import FilterSet
-from store import models
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import SearchFilter
+from store import models, pricing, search
 
 
 class ProductFilter(FilterSet):
@@ -8,4 +13,153 @@ class ProductFilter(FilterSet):
         fields = {
             "collection_id": ["exact"],
             "price": ["gte", "lte"],
+            "effective_price": ["gte", "lte"],
         }
+
+
+class OrderFilter(FilterSet):
+    class Meta:
+        model = models.Order
+        fields = {
+            "payment_status": ["exact"],
+            "placed_at": ["gte", "lte"],
+        }
+
+
+class ProductSearchFilter(SearchFilter):
+    """Full-text ``?search=`` over title and description, ranked by relevance"""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return search.search_products(queryset, " ".join(terms))
+
+
+class ProductFacets:
+    """Per-collection and price-bucket counts for the current filter/search state
+
+    Each facet ignores its own filter so the sidebar keeps offering the other
+    choices, and both facets are counted in a single GROUP BY collection pass.
+    Price buckets follow what the customer pays, the effective price.
+    """
+
+    query_param = "facets"
+    price_buckets_query_param = "price_buckets"
+    price_params = [
+        "price__gte",
+        "price__lte",
+        "effective_price__gte",
+        "effective_price__lte",
+    ]
+    facet_params = ["collection_id", *price_params]
+    default_price_buckets = [0, 10, 25, 50, 100, 250]
+    max_price_buckets = 20
+
+    def __init__(self, request, view):
+        self.request = request
+        self.view = view
+        filterset = ProductFilter(
+            request.query_params,
+            queryset=models.Product.objects.all(),
+            request=request,
+        )
+        if not filterset.is_valid():
+            raise utils.translate_validation(filterset.errors)
+        self.filters = filterset.form.cleaned_data
+
+    @classmethod
+    def requested(cls, request):
+        value = request.query_params.get(cls.query_param, "")
+        return value.lower() in ("1", "true", "yes")
+
+    def get_price_buckets(self):
+        raw = self.request.query_params.get(self.price_buckets_query_param)
+        if not raw:
+            return self.default_price_buckets
+        try:
+            bounds = [Decimal(value) for value in raw.split(",")]
+        except InvalidOperation:
+            raise ValidationError({self.price_buckets_query_param: "Not a number"})
+        if (
+            not all(bound.is_finite() for bound in bounds)
+            or bounds != sorted(set(bounds))
+            or len(bounds) > self.max_price_buckets
+        ):
+            raise ValidationError(
+                {
+                    self.price_buckets_query_param: "Expected at most "
+                    f"{self.max_price_buckets} increasing finite boundaries"
+                }
+            )
+        return bounds
+
+    def base_queryset(self):
+        """Products matching every filter except the faceted ones"""
+        data = self.request.query_params.copy()
+        for name in self.facet_params:
+            data.pop(name, None)
+        queryset = ProductFilter(
+            data, queryset=models.Product.objects.all(), request=self.request
+        ).qs
+        return ProductSearchFilter().filter_queryset(self.request, queryset, self.view)
+
+    def counts(self):
+        price_filter = Q()
+        for name in self.price_params:
+            if self.filters.get(name) is not None:
+                price_filter &= Q(**{name: self.filters[name]})
+
+        bounds = self.get_price_buckets()
+        buckets = {}
+        for index, low in enumerate(bounds):
+            condition = Q(bucket_price__gte=low)
+            if index + 1 < len(bounds):
+                condition &= Q(bucket_price__lt=bounds[index + 1])
+            buckets[f"bucket_{index}"] = Count("pk", filter=condition)
+
+        rows = (
+            self.base_queryset()
+            .alias(bucket_price=pricing.unit_price_expression(None))
+            .order_by()
+            .values("collection_id")
+            .annotate(matching=Count("pk", filter=price_filter or None), **buckets)
+        )
+
+        selected = self.filters.get("collection_id")
+        selected = getattr(selected, "pk", selected)
+        collections = []
+        totals = [0] * len(bounds)
+        for row in rows:
+            collections.append({"id": row["collection_id"], "count": row["matching"]})
+            if selected is None or row["collection_id"] == int(selected):
+                for index in range(len(bounds)):
+                    totals[index] += row[f"bucket_{index}"]
+
+        return {
+            "collection": sorted(collections, key=lambda facet: facet["id"]),
+            "price": [
+                {
+                    "min": low,
+                    "max": bounds[index + 1] if index + 1 < len(bounds) else None,
+                    "count": totals[index],
+                }
+                for index, low in enumerate(bounds)
+            ],
+        }
+
+
+class FacetsMixin:
+    """Add ``facets`` to paginated list responses when ``?facets=true`` is sent"""
+
+    facets_class = ProductFacets
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if (
+            response.status_code == 200
+            and isinstance(response.data, dict)
+            and self.facets_class.requested(request)
+        ):
+            response.data["facets"] = self.facets_class(request, self).counts()
+        return response
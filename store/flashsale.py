@@ -0,0 +1,143 @@
+"""Admission control for checkouts of products in flash-sale mode
+
+Every product with ``flash_sale`` set has a token pool in the cache, seeded
+from its inventory. A checkout takes tokens for its sale lines, plus one of
+FLASH_SALE["MAX_IN_FLIGHT"] slots, before any transaction opens. It keeps the
+tokens when the order is placed and gives them back when it fails. Requests
+that find no slot or no tokens are rejected right away with a Retry-After, so
+the database only sees checkouts that can still succeed.
+
+The pools only bound the load, store.inventory.reserve still guards the
+stock. They need a cache shared by all workers whose counters may go below
+zero, the Redis cache of the settings; LocMemCache gives every process a
+pool of its own (see the store.W001 check). Every write that changes the
+inventory of a product has to ``reset`` its pool.
+"""
+
+from contextlib import contextmanager
+from functools import partial
+from django.core.cache import cache
+from django.db import transaction
+from store import models, conf
+from store.cache import count, is_shared
+
+DEFAULTS = {"MAX_IN_FLIGHT": 8, "RETRY_AFTER": 1, "SOLD_OUT_RETRY_AFTER": 30}
+get_setting = partial(conf.get_setting, "FLASH_SALE", DEFAULTS)
+
+SLOTS_KEY = "store:flashsale:slots"
+ADMITTED_KEY = "store:flashsale:admitted"
+REJECTED_KEY = "store:flashsale:rejected"
+
+
+class Rejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def tokens_key(product_id):
+    return f"store:flashsale:tokens:{product_id}"
+
+
+def stock(product_id):
+    return (
+        models.Product.objects.filter(pk=product_id)
+        .values_list("inventory", flat=True)
+        .first()
+        or 0
+    )
+
+
+def take(key, amount, seed):
+    """Decrement ``key``, starting it at ``seed()`` when it isn't set"""
+    try:
+        return cache.decr(key, amount)
+    except ValueError:
+        cache.add(key, seed(), timeout=None)
+        return cache.decr(key, amount)
+
+
+def give(key, amount):
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        pass
+
+
+def sale_lines(items):
+    """``{product_id: quantity}`` of the cart items whose product is on sale"""
+    return {item.product_id: item.quantity for item in items if item.product.flash_sale}
+
+
+@contextmanager
+def admit(quantities):
+    """Hold a slot and the tokens of ``{product_id: quantity}`` while the body runs
+
+    Raises Rejected when no slot is free or a pool is empty. The tokens are
+    kept if the body succeeds and returned if it raises.
+    """
+    if not quantities:
+        yield
+        return
+
+    if take(SLOTS_KEY, 1, lambda: get_setting("MAX_IN_FLIGHT")) < 0:
+        give(SLOTS_KEY, 1)
+        count(REJECTED_KEY)
+        raise Rejected("busy", get_setting("RETRY_AFTER"))
+
+    taken = {}
+    try:
+        for product_id, quantity in sorted(quantities.items()):
+            taken[product_id] = quantity
+            if take(tokens_key(product_id), quantity, lambda: stock(product_id)) < 0:
+                count(REJECTED_KEY)
+                raise Rejected("sold out", get_setting("SOLD_OUT_RETRY_AFTER"))
+        count(ADMITTED_KEY)
+        yield
+    except BaseException:
+        for product_id, quantity in taken.items():
+            give(tokens_key(product_id), quantity)
+        raise
+    finally:
+        give(SLOTS_KEY, 1)
+
+
+def reset(*product_ids):
+    """Drop token pools so they are seeded again from the current inventory
+
+    Waits for the current transaction to commit, so the pools are never
+    seeded from the inventory it is replacing.
+    """
+    keys = [tokens_key(product_id) for product_id in product_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def reset_stats():
+    cache.delete_many([ADMITTED_KEY, REJECTED_KEY])
+
+
+def state():
+    """Token pools of the products on sale plus the admission counters"""
+    products = list(
+        models.Product.objects.filter(flash_sale=True)
+        .order_by("id")
+        .values("id", "title", "inventory")
+    )
+    values = cache.get_many(
+        [tokens_key(product["id"]) for product in products]
+        + [SLOTS_KEY, ADMITTED_KEY, REJECTED_KEY]
+    )
+    for product in products:
+        product["tokens"] = values.get(tokens_key(product["id"]))
+
+    max_in_flight = get_setting("MAX_IN_FLIGHT")
+    return {
+        "shared": is_shared(),
+        "max_in_flight": max_in_flight,
+        "in_flight": max_in_flight - values.get(SLOTS_KEY, max_in_flight),
+        "admitted": values.get(ADMITTED_KEY, 0),
+        "rejected": values.get(REJECTED_KEY, 0),
+        "products": products,
+    }
@@ -0,0 +1,48 @@
+"""Pillow work for product image variants
+
+Runs inside worker processes, so nothing here may touch Django models.
+"""
+
+import hashlib
+import os
+from PIL import Image, ImageOps
+
+WIDTHS = [200, 400, 800]
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+QUALITY = 80
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def variant_name(digest, width, format):
+    return f"store/variants/{digest[:2]}/{digest}/{width}.{format}"
+
+
+def render(source, media_root):
+    """Write every missing variant of ``source`` and return its sha256"""
+    digest = file_digest(source)
+    image = None
+    for width in WIDTHS:
+        for format, pillow_format in FORMATS.items():
+            target = os.path.join(media_root, variant_name(digest, width, format))
+            if os.path.exists(target):
+                continue
+            if image is None:
+                image = ImageOps.exif_transpose(Image.open(source))
+
+            variant = image.copy()
+            variant.thumbnail((width, variant.height))
+            if pillow_format == "JPEG" and variant.mode != "RGB":
+                variant = variant.convert("RGB")
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            partial = f"{target}.{os.getpid()}.tmp"
+            variant.save(partial, pillow_format, quality=QUALITY)
+            os.replace(partial, target)
+    return digest
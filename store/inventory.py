@@ -0,0 +1,51 @@
+from django.db.models import Case, F, IntegerField, Q, When
+from django.utils import timezone
+from store import models, cache
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def reserve(quantities):
+    """Take ``{product_id: quantity}`` out of inventory in one UPDATE
+
+    Each row is only decremented while ``inventory >= quantity``; the row
+    lock taken by the UPDATE makes concurrent checkouts re-check that
+    condition against committed stock, so nothing is oversold and no
+    SELECT ... FOR UPDATE is needed. Raises OutOfStock when any line could
+    not be taken, call inside the order's transaction so it rolls back.
+    """
+    if not quantities:
+        return
+    condition = Q()
+    decrements = []
+    for product_id, quantity in quantities.items():
+        condition |= Q(pk=product_id, inventory__gte=quantity)
+        decrements.append(When(pk=product_id, then=F("inventory") - quantity))
+
+    updated = models.Product.objects.filter(condition).update(
+        inventory=Case(
+            *decrements, default=F("inventory"), output_field=IntegerField()
+        ),
+        last_update=timezone.now(),
+    )
+    if updated < len(quantities):
+        raise OutOfStock()
+    cache.bump(models.Product)
+
+
+def shortfall(quantities):
+    """Lines of ``{product_id: quantity}`` that current stock cannot cover"""
+    available = dict(
+        models.Product.objects.filter(pk__in=quantities).values_list("pk", "inventory")
+    )
+    return [
+        {
+            "product_id": product_id,
+            "requested": quantity,
+            "available": available.get(product_id, 0),
+        }
+        for product_id, quantity in sorted(quantities.items())
+        if available.get(product_id, 0) < quantity
+    ]
@@ -0,0 +1,47 @@
+from time import perf_counter, sleep
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from store import models, orders
+
+
+class Command(BaseCommand):
+    help = "Fill in the stored totals and item titles of older orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--pause", type=float, default=0.1, help="seconds between batches"
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="recompute every order, not only those without stored totals",
+        )
+
+    def handle(self, *args, **options):
+        queryset = models.Order.objects.all()
+        if not options["all"]:
+            queryset = queryset.filter(item_count=0)
+
+        done = 0
+        after = 0
+        start = perf_counter()
+        while True:
+            ids = list(
+                queryset.filter(pk__gt=after)
+                .order_by("pk")
+                .values_list("pk", flat=True)[: options["batch_size"]]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                done += orders.refresh(ids)
+            after = ids[-1]
+            self.stdout.write(f"{done} orders, up to #{after}")
+            sleep(options["pause"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Backfilled {done} orders in {perf_counter() - start:.1f}s"
+            )
+        )
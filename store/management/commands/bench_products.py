@@ -0,0 +1,51 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from store import models, serializers
+
+
+class Command(BaseCommand):
+    help = "Compare ProductSerializer with the ProductReadSerializer fast path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def run(self, build):
+        queries = CaptureQueriesContext(connection)
+        start = perf_counter()
+        with queries:
+            for _ in range(self.repeat):
+                body = JSONRenderer().render(build())
+        elapsed = (perf_counter() - start) / self.repeat
+        return body, elapsed, len(queries) // self.repeat
+
+    def handle(self, *args, **options):
+        self.repeat = options["repeat"]
+        limit = options["limit"]
+        queryset = models.Product.objects.select_related("collection").order_by("id")
+
+        slow_body, slow_time, slow_queries = self.run(
+            lambda: serializers.ProductSerializer(queryset[:limit], many=True).data
+        )
+        fast_body, fast_time, fast_queries = self.run(
+            lambda: serializers.ProductReadSerializer(
+                serializers.ProductReadSerializer.rows(queryset)[:limit], many=True
+            ).data
+        )
+
+        self.stdout.write(
+            f"ProductSerializer:     {slow_time * 1000:8.2f} ms {slow_queries} queries"
+        )
+        self.stdout.write(
+            f"ProductReadSerializer: {fast_time * 1000:8.2f} ms {fast_queries} queries"
+        )
+        if fast_time:
+            self.stdout.write(f"Speedup: {slow_time / fast_time:.1f}x")
+
+        if slow_body == fast_body:
+            self.stdout.write(self.style.SUCCESS("Responses are identical"))
+        else:
+            self.stdout.write(self.style.ERROR("Responses differ!"))
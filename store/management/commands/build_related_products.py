@@ -0,0 +1,20 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from store import related
+
+
+class Command(BaseCommand):
+    help = "Rebuild the frequently bought together table from OrderItem history"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=related.TOP_K)
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        rows = related.rebuild(options["top_k"], options["chunk_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {rows} related products in {perf_counter() - start:.1f}s"
+            )
+        )
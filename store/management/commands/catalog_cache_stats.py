@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from store import cache
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the catalog response cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true")
+
+    def handle(self, *args, **options):
+        stats = cache.stats()
+        total = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / total if total else 0
+        self.stdout.write(
+            f"hits: {stats['hits']}  misses: {stats['misses']}  hit ratio: {ratio:.1%}"
+        )
+        if options["reset"]:
+            cache.reset_stats()
@@ -0,0 +1,57 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from store import models
+
+
+class Command(BaseCommand):
+    help = "Move legacy product images into content-addressed storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        field = models.ProductImage._meta.get_field("image")
+        storage = field.storage
+        moved = {}
+        last_id = 0
+
+        while True:
+            batch = list(
+                models.ProductImage.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", "image")[: options["batch_size"]]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            for pk, name in batch:
+                if not name or name in moved or storage.is_content_addressed(name):
+                    continue
+                if not storage.exists(name):
+                    self.stderr.write(f"ProductImage {pk}: {name} is missing")
+                    continue
+                if options["dry_run"]:
+                    moved[name] = None
+                    continue
+
+                with transaction.atomic(), storage.open(name) as file:
+                    moved[name] = storage.save(
+                        field.generate_filename(None, name.rsplit("/", 1)[-1]),
+                        File(file),
+                    )
+                    models.ProductImage.objects.filter(image=name).update(
+                        image=moved[name]
+                    )
+                storage.delete(name)
+                self.stdout.write(f"{name} -> {moved[name]}")
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(moved)} files to move")
+            return
+        distinct = len(set(moved.values()))
+        self.stdout.write(
+            self.style.SUCCESS(f"Moved {len(moved)} files into {distinct} blobs")
+        )
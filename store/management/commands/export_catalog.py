@@ -0,0 +1,72 @@
+import sys
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from store import models, catalog
+
+
+class Command(BaseCommand):
+    help = "Stream every product with its collection and promotions to CSV/JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="output file, - for stdout")
+        parser.add_argument("--format", choices=catalog.FORMATS)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = options["format"] or catalog.guess_format(path)
+        chunk_size = options["chunk_size"]
+
+        stream = (
+            sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+        )
+        writer = catalog.RecordWriter(stream, format)
+        rows = (
+            models.Product.objects.order_by("id")
+            .values(
+                "id",
+                "slug",
+                "title",
+                "description",
+                "price",
+                "inventory",
+                "collection__title",
+            )
+            .iterator(chunk_size=chunk_size)
+        )
+
+        start = perf_counter()
+        exported = 0
+        try:
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    exported += self.write_chunk(writer, chunk)
+                    chunk = []
+            exported += self.write_chunk(writer, chunk)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        elapsed = perf_counter() - start
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"Exported {exported} products in {elapsed:.1f}s "
+                f"({exported / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
+
+    def write_chunk(self, writer, chunk):
+        links = models.Product.promotions.through.objects.filter(
+            product_id__in=[row["id"] for row in chunk]
+        ).values_list("product_id", "promotions_id")
+        promotions = {}
+        for product_id, promotion_id in links:
+            promotions.setdefault(product_id, []).append(promotion_id)
+
+        for row in chunk:
+            row["collection"] = row.pop("collection__title")
+            row["promotions"] = promotions.get(row["id"], [])
+            writer.write(row)
+        return len(chunk)
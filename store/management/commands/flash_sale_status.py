@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from store import flashsale
+
+
+class Command(BaseCommand):
+    help = "Show token pools and admission counters of the running flash sales"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true")
+
+    def handle(self, *args, **options):
+        state = flashsale.state()
+        self.stdout.write(
+            f"in flight: {state['in_flight']}/{state['max_in_flight']}  "
+            f"admitted: {state['admitted']}  rejected: {state['rejected']}"
+        )
+        if not state["shared"]:
+            self.stderr.write(
+                "The cache is not shared, this only shows this process's pools"
+            )
+        for product in state["products"]:
+            tokens = "unseeded" if product["tokens"] is None else product["tokens"]
+            self.stdout.write(
+                f"#{product['id']} {product['title']}: "
+                f"tokens {tokens}, inventory {product['inventory']}"
+            )
+        if options["reset"]:
+            flashsale.reset_stats()
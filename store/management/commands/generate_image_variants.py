@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from store import models, imaging, variants
+
+
+class Command(BaseCommand):
+    help = "Render resized WebP/JPEG variants of product images in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--all", action="store_true", help="re-check ready images")
+
+    def handle(self, *args, **options):
+        images = models.ProductImage.objects.order_by("pk")
+        if not options["all"]:
+            images = images.filter(variants_ready=False)
+
+        storage = models.ProductImage._meta.get_field("image").storage
+        media_root = str(settings.MEDIA_ROOT)
+        done = failed = 0
+        last_id = 0
+        start = perf_counter()
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                batch = list(
+                    images.filter(pk__gt=last_id).values_list("pk", "image")[
+                        : options["batch_size"]
+                    ]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+
+                futures = {
+                    pk: executor.submit(imaging.render, storage.path(name), media_root)
+                    for pk, name in batch
+                    if name
+                }
+                digests = {}
+                for pk, future in futures.items():
+                    try:
+                        digests[pk] = future.result()
+                    except Exception as error:
+                        failed += 1
+                        self.stderr.write(f"ProductImage {pk}: {error!r}")
+                if digests:
+                    variants.mark_ready(digests)
+
+                done += len(digests)
+                self.stdout.write(
+                    f"{done} images, {done / (perf_counter() - start):.1f} images/s"
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rendered {done} images, {failed} failed")
+        )
@@ -0,0 +1,192 @@
+import sys
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from store import models, catalog, search, pricing, cache, flashsale
+
+PRODUCT_FIELDS = ["slug", "title", "description", "price", "inventory"]
+# Product.price is max_digits=6, decimal_places=2
+MAX_PRICE = Decimal("9999.99")
+
+
+class Command(BaseCommand):
+    help = "Upsert collections, products and promotion links from a CSV/JSONL feed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file, - for stdin")
+        parser.add_argument("--format", choices=catalog.FORMATS)
+        parser.add_argument("--key", choices=["slug", "id"], default="slug")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = options["format"] or catalog.guess_format(path)
+        self.key = options["key"]
+        self.format = format
+        self.created = self.updated = self.skipped = 0
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        start = perf_counter()
+        try:
+            records = enumerate(catalog.read_records(stream, format), start=1)
+            while batch := list(islice(records, options["batch_size"])):
+                self.import_batch(batch)
+                done = self.created + self.updated + self.skipped
+                self.stdout.write(
+                    f"{done} rows, {done / (perf_counter() - start):.0f} rows/s"
+                )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if self.key == "id":
+            self.reset_sequence()
+        cache.bump(models.Product)
+        cache.bump(models.Collection)
+        elapsed = perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {self.created}, updated {self.updated}, "
+                f"skipped {self.skipped} in {elapsed:.1f}s"
+            )
+        )
+
+    def reset_sequence(self):
+        statements = connection.ops.sequence_reset_sql(no_style(), [models.Product])
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def clean(self, line, record):
+        try:
+            record = catalog.parse_record(record, self.format)
+            values = {
+                "slug": record.get("slug") or "-",
+                "title": record["title"],
+                "description": record.get("description") or "",
+                "price": Decimal(str(record["price"])),
+                "inventory": int(record["inventory"]),
+                "collection": record["collection"],
+            }
+            if self.key == "id":
+                values["id"] = int(record["id"])
+        except (KeyError, ValueError, TypeError, InvalidOperation) as error:
+            self.stderr.write(f"line {line}: invalid record ({error!r})")
+            return None
+        if (
+            not values["price"].is_finite()
+            or not 1 <= values["price"] <= MAX_PRICE
+            or values["inventory"] < 0
+        ):
+            self.stderr.write(f"line {line}: price or inventory out of range")
+            return None
+        if self.key == "slug" and values["slug"] == "-":
+            self.stderr.write(f"line {line}: missing slug")
+            return None
+        values["promotions"] = record.get("promotions")
+        return values
+
+    def get_collections(self, titles):
+        collections = dict(
+            models.Collection.objects.filter(title__in=titles).values_list(
+                "title", "id"
+            )
+        )
+        missing = [
+            models.Collection(title=title) for title in titles - collections.keys()
+        ]
+        if missing:
+            models.Collection.objects.bulk_create(missing)
+            collections.update(
+                models.Collection.objects.filter(
+                    title__in=[collection.title for collection in missing]
+                ).values_list("title", "id")
+            )
+        return collections
+
+    @transaction.atomic
+    def import_batch(self, batch):
+        rows = []
+        for line, record in batch:
+            values = self.clean(line, record)
+            if values is None:
+                self.skipped += 1
+            else:
+                rows.append(values)
+        if not rows:
+            return
+
+        collections = self.get_collections({row["collection"] for row in rows})
+        existing = {
+            getattr(product, self.key): product
+            for product in models.Product.objects.filter(
+                **{f"{self.key}__in": [row[self.key] for row in rows]}
+            )
+        }
+
+        new, changed, products = [], {}, []
+        for row in rows:
+            product = existing.get(row[self.key])
+            if product is None:
+                product = models.Product()
+                new.append(product)
+            elif not product._state.adding:
+                changed[row[self.key]] = product
+            for field in PRODUCT_FIELDS:
+                setattr(product, field, row[field])
+            if self.key == "id":
+                product.id = row["id"]
+            product.collection_id = collections[row["collection"]]
+            existing[row[self.key]] = product
+            products.append((product, row["promotions"]))
+
+        models.Product.objects.bulk_create(new)
+        models.Product.objects.bulk_update(
+            changed.values(), PRODUCT_FIELDS + ["collection"]
+        )
+        if any(product.pk is None for product in new):
+            # backends without RETURNING, products are keyed by slug here
+            ids = dict(
+                models.Product.objects.filter(
+                    slug__in=[product.slug for product in new]
+                ).values_list("slug", "id")
+            )
+            for product in new:
+                product.pk = ids[product.slug]
+
+        self.link_promotions(products)
+        product_ids = [product.pk for product, _ in products]
+        search.reindex(product_ids)
+        pricing.refresh(product_ids)
+        flashsale.reset(*[product.pk for product in changed.values()])
+        self.created += len(new)
+        self.updated += len(changed)
+
+    def link_promotions(self, products):
+        products = [
+            (product, promotions)
+            for product, promotions in products
+            if promotions is not None
+        ]
+        if not products:
+            return
+
+        Link = models.Product.promotions.through
+        known = set(
+            models.Promotions.objects.filter(
+                pk__in={pk for _, promotions in products for pk in promotions}
+            ).values_list("pk", flat=True)
+        )
+        Link.objects.filter(product__in=[product for product, _ in products]).delete()
+        Link.objects.bulk_create(
+            [
+                Link(product_id=product.pk, promotions_id=pk)
+                for product, promotions in products
+                for pk in promotions
+                if pk in known
+            ],
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,159 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+from uuid import uuid4
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from rest_framework.test import APIRequestFactory, force_authenticate
+from store import models, carts, flashsale, views
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent checkouts of one product and report latency percentiles, "
+        "run it against a local database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_id", type=int)
+        parser.add_argument("--stock", type=int, default=50)
+        parser.add_argument("--buyers", type=int, default=300)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--quantity", type=int, default=1)
+        parser.add_argument(
+            "--no-sale",
+            action="store_true",
+            help="leave flash_sale off to compare against plain checkouts",
+        )
+        parser.add_argument(
+            "--attempts",
+            type=int,
+            default=3,
+            help="tries per buyer, a 429 is retried after its Retry-After",
+        )
+        parser.add_argument(
+            "--max-wait",
+            type=int,
+            default=2,
+            help="give up instead of retrying when Retry-After is longer",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="keep the buyers and their orders"
+        )
+
+    def handle(self, *args, **options):
+        product = models.Product.objects.get(pk=options["product_id"])
+        models.Product.objects.filter(pk=product.pk).update(
+            inventory=options["stock"], flash_sale=not options["no_sale"]
+        )
+        flashsale.reset(product.pk)
+        flashsale.reset_stats()
+
+        users = self.create_buyers(options["buyers"])
+        storage = carts.get_storage()
+        cart_ids = []
+        for _ in users:
+            cart = storage.create()
+            storage.add_items(cart.id, {product.pk: options["quantity"]})
+            cart_ids.append(cart.id)
+
+        view = views.OrderViewSet.as_view({"post": "create"})
+        factory = APIRequestFactory()
+
+        def attempt(user, cart_id):
+            request = factory.post(
+                "/api/orders/", {"cart_id": str(cart_id)}, format="json"
+            )
+            force_authenticate(request, user)
+            start = perf_counter()
+            try:
+                response = view(request)
+                status, wait = response.status_code, response.get("Retry-After")
+            except Exception as error:
+                status, wait = type(error).__name__, None
+            finally:
+                connection.close()
+            return status, wait, perf_counter() - start
+
+        def checkout(user, cart_id):
+            latencies = []
+            for _ in range(options["attempts"]):
+                status, wait, seconds = attempt(user, cart_id)
+                latencies.append(seconds)
+                if status != 429 or int(wait or 0) > options["max_wait"]:
+                    break
+                sleep(int(wait or 0))
+            return status, latencies
+
+        start = perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            results = list(pool.map(checkout, users, cart_ids))
+        elapsed = perf_counter() - start
+
+        self.report(product, options, results, elapsed, users)
+        if not options["keep"]:
+            self.clean_up(product, users, cart_ids)
+
+    def create_buyers(self, count):
+        run = uuid4().hex[:8]
+        return [
+            get_user_model().objects.create(
+                username=f"loadtest-{run}-{index}",
+                email=f"loadtest-{run}-{index}@example.com",
+            )
+            for index in range(count)
+        ]
+
+    def report(self, product, options, results, elapsed, users):
+        statuses = Counter(status for status, _ in results)
+        latencies = sorted(
+            seconds * 1000 for _, attempts in results for seconds in attempts
+        )
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        sold = (
+            models.OrderItem.objects.filter(
+                product=product, order__customer__user__in=users
+            ).aggregate(sold=Sum("quantity"))["sold"]
+            or 0
+        )
+        left = models.Product.objects.get(pk=product.pk).inventory
+
+        self.stdout.write(
+            f"{len(results)} checkouts in {elapsed:.2f}s, "
+            f"flash sale {'off' if options['no_sale'] else 'on'}"
+        )
+        self.stdout.write(
+            "status: "
+            + "  ".join(
+                f"{status}: {n}" for status, n in sorted(statuses.items(), key=str)
+            )
+        )
+        self.stdout.write(
+            f"{len(latencies)} attempts, latency ms  p50: {percentile(0.5):.1f}  p95: {percentile(0.95):.1f}  "
+            f"p99: {percentile(0.99):.1f}  max: {latencies[-1]:.1f}"
+        )
+        self.stdout.write(f"admission: {flashsale.state()}")
+        if sold + left == options["stock"]:
+            self.stdout.write(self.style.SUCCESS(f"Sold {sold}, {left} left"))
+        else:
+            self.stdout.write(
+                self.style.ERROR(f"Sold {sold} with {left} left of {options['stock']}!")
+            )
+
+    def clean_up(self, product, users, cart_ids):
+        storage = carts.get_storage()
+        for cart_id in cart_ids:
+            storage.delete(cart_id)
+        orders = models.Order.objects.filter(customer__user__in=users)
+        models.OrderItem.objects.filter(order__in=orders).delete()
+        orders.delete()
+        get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
+        models.Product.objects.filter(pk=product.pk).update(
+            inventory=product.inventory, flash_sale=product.flash_sale
+        )
+        flashsale.reset(product.pk)
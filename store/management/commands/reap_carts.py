@@ -0,0 +1,57 @@
+from datetime import timedelta
+from time import perf_counter, sleep
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from store import carts
+
+
+class Command(BaseCommand):
+    help = "Delete database carts idle for longer than CART_TTL, in throttled batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ttl", type=int, help="idle seconds, CART_TTL by default")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--pause", type=float, default=0.1, help="seconds between batches"
+        )
+        parser.add_argument(
+            "--pause-ratio",
+            type=float,
+            default=1.0,
+            help="also sleep this many times as long as the last batch took",
+        )
+        parser.add_argument(
+            "--every", type=int, help="keep running, one pass every N seconds"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.reap(options)
+            if not options["every"]:
+                break
+            sleep(options["every"])
+
+    def reap(self, options):
+        ttl = options["ttl"] or carts.get_ttl()
+        before = timezone.now() - timedelta(seconds=ttl)
+        deleted = 0
+        after = None
+        start = perf_counter()
+
+        while True:
+            batch_start = perf_counter()
+            ids = carts.delete_expired(before, options["batch_size"], after)
+            if not ids:
+                break
+            deleted += len(ids)
+            after = ids[-1]
+            elapsed = perf_counter() - batch_start
+            self.stdout.write(f"{deleted} carts, last batch {elapsed * 1000:.0f}ms")
+            sleep(max(options["pause"], elapsed * options["pause_ratio"]))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} carts idle since {before:%Y-%m-%d %H:%M} "
+                f"in {perf_counter() - start:.1f}s"
+            )
+        )
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from store import models
+
+
+class Command(BaseCommand):
+    help = "Recount Collection.product_count in batches and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checked = fixed = 0
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                collections = list(
+                    models.Collection.objects.select_for_update()
+                    .filter(pk__gt=last_id)
+                    .order_by("pk")
+                    .only("id", "product_count")[:batch_size]
+                )
+                if not collections:
+                    break
+                last_id = collections[-1].pk
+
+                counts = dict(
+                    models.Product.objects.filter(collection__in=collections)
+                    .order_by()
+                    .values_list("collection_id")
+                    .annotate(count=Count("pk"))
+                )
+                drifted = []
+                for collection in collections:
+                    actual = counts.get(collection.pk, 0)
+                    if collection.product_count != actual:
+                        self.stdout.write(
+                            f"Collection {collection.pk}: "
+                            f"{collection.product_count} -> {actual}"
+                        )
+                        collection.product_count = actual
+                        drifted.append(collection)
+
+                if drifted and not options["dry_run"]:
+                    models.Collection.objects.bulk_update(drifted, ["product_count"])
+
+            checked += len(collections)
+            fixed += len(drifted)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} collections, {fixed} drifted")
+        )
@@ -0,0 +1,82 @@
+from datetime import timedelta
+from threading import Event, Lock, Thread
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from store import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox events to their handlers with a pool of worker threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--poll", type=float, default=1.0, help="seconds to wait when idle"
+        )
+        parser.add_argument(
+            "--report-every", type=float, default=10.0, help="seconds between reports"
+        )
+        parser.add_argument(
+            "--keep-days",
+            type=int,
+            default=7,
+            help="delete delivered events older than this on every report",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="exit when nothing is due"
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stopping = Event()
+        self.lock = Lock()
+        self.claimed = self.delivered = 0
+        start = perf_counter()
+
+        threads = [
+            Thread(target=self.work, name=f"outbox-{index}")
+            for index in range(options["workers"])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(options["report_every"] / len(threads))
+                self.report(perf_counter() - start)
+        except KeyboardInterrupt:
+            self.stopping.set()
+            for thread in threads:
+                thread.join()
+            self.report(perf_counter() - start)
+
+    def work(self):
+        try:
+            while not self.stopping.is_set():
+                events, delivered = outbox.process(self.options["batch_size"])
+                with self.lock:
+                    self.claimed += len(events)
+                    self.delivered += delivered
+                if not events:
+                    if self.options["once"]:
+                        break
+                    self.stopping.wait(self.options["poll"])
+        finally:
+            connection.close()
+
+    def report(self, elapsed):
+        purged = outbox.purge(
+            timezone.now() - timedelta(days=self.options["keep_days"])
+        )
+        stats = outbox.stats()
+        with self.lock:
+            claimed, delivered = self.claimed, self.delivered
+        rate = delivered / elapsed if elapsed else 0
+        self.stdout.write(
+            f"delivered {delivered}/{claimed} ({rate:.0f}/s), "
+            f"pending {stats['pending']}, failed {stats['failed']}, "
+            f"lag {stats['lag']:.1f}s, purged {purged}"
+        )
@@ -0,0 +1,25 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from store import popularity
+
+
+class Command(BaseCommand):
+    help = "Recompute Product.popularity from recent sales and likes, run periodically"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--half-life", type=float, default=popularity.HALF_LIFE_DAYS
+        )
+        parser.add_argument("--window", type=int, default=popularity.WINDOW_DAYS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        changed = popularity.update(
+            options["half_life"], options["window"], options["batch_size"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated {changed} products in {perf_counter() - start:.1f}s"
+            )
+        )
@@ -0,0 +1,153 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:37
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+POSTGRESQL_TRIGGERS = [
+    """
+    CREATE FUNCTION store_product_count() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE store_collection
+            SET product_count = product_count - 1, last_update = now()
+            WHERE id = OLD.collection_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE store_collection
+            SET product_count = product_count + 1, last_update = now()
+            WHERE id = NEW.collection_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER store_product_count_insert_delete
+    AFTER INSERT OR DELETE ON store_product
+    FOR EACH ROW EXECUTE FUNCTION store_product_count()
+    """,
+    """
+    CREATE TRIGGER store_product_count_update
+    AFTER UPDATE OF collection_id ON store_product
+    FOR EACH ROW WHEN (OLD.collection_id IS DISTINCT FROM NEW.collection_id)
+    EXECUTE FUNCTION store_product_count()
+    """,
+]
+
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER store_product_count_insert AFTER INSERT ON store_product
+    BEGIN
+        UPDATE store_collection
+        SET product_count = product_count + 1, last_update = {SQLITE_NOW}
+        WHERE id = NEW.collection_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER store_product_count_delete AFTER DELETE ON store_product
+    BEGIN
+        UPDATE store_collection
+        SET product_count = product_count - 1, last_update = {SQLITE_NOW}
+        WHERE id = OLD.collection_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER store_product_count_update AFTER UPDATE OF collection_id
+    ON store_product WHEN OLD.collection_id <> NEW.collection_id
+    BEGIN
+        UPDATE store_collection
+        SET product_count = product_count - 1, last_update = {SQLITE_NOW}
+        WHERE id = OLD.collection_id;
+        UPDATE store_collection
+        SET product_count = product_count + 1, last_update = {SQLITE_NOW}
+        WHERE id = NEW.collection_id;
+    END
+    """,
+]
+
+MYSQL_NOW = "UTC_TIMESTAMP(6)"
+MYSQL_TRIGGERS = [
+    f"""
+    CREATE TRIGGER store_product_count_insert AFTER INSERT ON store_product
+    FOR EACH ROW
+        UPDATE store_collection
+        SET product_count = product_count + 1, last_update = {MYSQL_NOW}
+        WHERE id = NEW.collection_id
+    """,
+    f"""
+    CREATE TRIGGER store_product_count_delete AFTER DELETE ON store_product
+    FOR EACH ROW
+        UPDATE store_collection
+        SET product_count = product_count - 1, last_update = {MYSQL_NOW}
+        WHERE id = OLD.collection_id
+    """,
+    f"""
+    CREATE TRIGGER store_product_count_update AFTER UPDATE ON store_product
+    FOR EACH ROW
+        UPDATE store_collection
+        SET product_count = product_count
+            + (id = NEW.collection_id) - (id = OLD.collection_id),
+            last_update = {MYSQL_NOW}
+        WHERE OLD.collection_id <> NEW.collection_id
+            AND id IN (OLD.collection_id, NEW.collection_id)
+    """,
+]
+
+DROP_TRIGGERS = {
+    "postgresql": [
+        "DROP TRIGGER IF EXISTS store_product_count_insert_delete ON store_product",
+        "DROP TRIGGER IF EXISTS store_product_count_update ON store_product",
+        "DROP FUNCTION IF EXISTS store_product_count()",
+    ],
+    "sqlite": [
+        "DROP TRIGGER IF EXISTS store_product_count_insert",
+        "DROP TRIGGER IF EXISTS store_product_count_delete",
+        "DROP TRIGGER IF EXISTS store_product_count_update",
+    ],
+}
+DROP_TRIGGERS["mysql"] = DROP_TRIGGERS["sqlite"]
+
+TRIGGERS = {
+    "postgresql": POSTGRESQL_TRIGGERS,
+    "sqlite": SQLITE_TRIGGERS,
+    "mysql": MYSQL_TRIGGERS,
+}
+
+
+def create_triggers(apps, schema_editor):
+    Collection = apps.get_model("store", "Collection")
+    Product = apps.get_model("store", "Product")
+    counts = (
+        Product.objects.filter(collection_id=OuterRef("pk"))
+        .order_by()
+        .values("collection_id")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    Collection.objects.update(product_count=Coalesce(Subquery(counts), 0))
+
+    for statement in TRIGGERS.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_triggers(apps, schema_editor):
+    for statement in DROP_TRIGGERS.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_collection_last_update'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
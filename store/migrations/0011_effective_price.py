@@ -0,0 +1,68 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:39
+
+import django.core.validators
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Round
+
+
+def fill_effective_price(apps, schema_editor):
+    Product = apps.get_model("store", "Product")
+    discounts = (
+        Product.promotions.through.objects.filter(product_id=OuterRef("pk"))
+        .order_by()
+        .values("product_id")
+        .annotate(best=Max("promotions__discount"))
+        .values("best")
+    )
+    discount = Cast(
+        Coalesce(Subquery(discounts), Value(0.0)),
+        models.DecimalField(max_digits=5, decimal_places=4),
+    )
+    Product.objects.update(
+        effective_price=Round(
+            F("price") * (Value(1) - discount) * Value(Decimal("1.2")),
+            2,
+            output_field=models.DecimalField(max_digits=8, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_collection_product_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="effective_price",
+            field=models.DecimalField(
+                decimal_places=2, editable=False, max_digits=8, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.DecimalField(decimal_places=2, max_digits=8),
+        ),
+        migrations.AlterField(
+            model_name="promotions",
+            name="discount",
+            field=models.FloatField(
+                validators=[
+                    django.core.validators.MinValueValidator(0),
+                    django.core.validators.MaxValueValidator(1),
+                ]
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["effective_price", "id"], name="store_produ_effecti_707a96_idx"
+            ),
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+    ]
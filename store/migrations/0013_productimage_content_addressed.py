@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:45
+
+import store.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_productimage_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='digest',
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(
+                db_index=True,
+                storage=store.storage.ContentAddressedStorage(),
+                upload_to='store/images',
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:50
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def summarize_reviews(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    reviews = (
+        Review.objects.filter(product_id=OuterRef('pk'))
+        .order_by()
+        .values('product_id')
+    )
+    Product.objects.update(
+        review_count=Coalesce(
+            Subquery(reviews.annotate(count=Count('pk')).values('count')), 0
+        ),
+        latest_review_at=Subquery(reviews.annotate(latest=Max('date')).values('latest')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_product_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='latest_review_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(
+                fields=['product', 'date', 'id'], name='store_revie_product_9c1f89_idx'
+            ),
+        ),
+        migrations.RunPython(summarize_reviews, migrations.RunPython.noop),
+    ]
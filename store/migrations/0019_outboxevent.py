@@ -0,0 +1,56 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_product_flash_sale'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('topic', models.CharField(max_length=100)),
+                ('handler', models.CharField(max_length=255)),
+                ('payload', models.JSONField()),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[('P', 'Pending'), ('D', 'Done'), ('F', 'Failed')],
+                        default='P',
+                        max_length=1,
+                    ),
+                ),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                (
+                    'available_at',
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('claim', models.UUIDField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(
+                        fields=['status', 'available_at', 'id'],
+                        name='store_outbo_status_2a0ca5_idx',
+                    )
+                ],
+            },
+        ),
+    ]
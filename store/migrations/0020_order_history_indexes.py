@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(
+                fields=['customer', 'placed_at', 'id'],
+                name='store_order_custome_c64870_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(
+                fields=['placed_at', 'id'], name='store_order_placed__61eeee_idx'
+            ),
+        ),
+    ]
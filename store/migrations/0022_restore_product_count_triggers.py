@@ -0,0 +1,25 @@
+from importlib import import_module
+
+from django.db import migrations
+
+# SQLite adds NOT NULL columns by copying the table, which drops its
+# triggers; 0015, 0016 and 0018 did that to the ones 0010 created
+product_count = import_module('store.migrations.0010_collection_product_count')
+
+
+def restore_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    product_count.drop_triggers(apps, schema_editor)
+    product_count.create_triggers(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_order_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
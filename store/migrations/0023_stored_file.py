@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_restore_product_count_triggers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                (
+                    'name',
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+            ],
+        ),
+    ]
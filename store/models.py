@@ -1,24 +1,43 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib import admin
-from django.core.validators import MinValueValidator
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.conf import settings
+from django.utils import timezone
+from django.contrib.postgres.search import SearchVectorField
 from uuid import uuid4
+from store import storage
 
 
 class Promotions(models.Model):
     description = models.CharField(max_length=255)
-    discount = models.FloatField()
+    # fraction taken off the price, 0.15 means 15% off
+    discount = models.FloatField(
+        validators=[MinValueValidator(0), MaxValueValidator(1)]
+    )
 
 
 class Collection(models.Model):
     title = models.CharField(max_length=255)
+    last_update = models.DateTimeField(auto_now=True)
     featured_product = models.ForeignKey(
         "Product", on_delete=models.SET_NULL, null=True, related_name="+", blank=True
     )
+    # Maintained by database triggers on store_product, see reconcile_product_counts
+    product_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get("update_fields"):
+            # never write back a product_count that may have moved since loading
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "product_count"
+            ]
+        super().save(*args, **kwargs)
+
 
 class Product(models.Model):
     title = models.CharField(max_length=255)
@@ -27,20 +46,80 @@ class Product(models.Model):
     price = models.DecimalField(
         max_digits=6, decimal_places=2, validators=[MinValueValidator(1)]
     )
+    # best promotion then tax, maintained by store.pricing.refresh
+    effective_price = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, editable=False
+    )
     inventory = models.PositiveIntegerField()
     last_update = models.DateTimeField(auto_now=True)
     collection = models.ForeignKey(Collection, on_delete=models.PROTECT)
     promotions = models.ManyToManyField(Promotions)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # decayed sales plus likes, maintained by store.popularity.update
+    popularity = models.FloatField(default=0, editable=False)
+    # review summary, maintained by the Review signal handlers
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    latest_review_at = models.DateTimeField(null=True, editable=False)
+    # checkouts go through store.flashsale admission
+    flash_sale = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["price", "id"]),
+            models.Index(fields=["collection", "price", "id"]),
+            models.Index(fields=["effective_price", "id"]),
+            models.Index(fields=["popularity", "id"]),
+        ]
 
     def __str__(self):
         return self.title
 
+    # kept up to date by queryset updates elsewhere, see save()
+    maintained_fields = [
+        "review_count",
+        "latest_review_at",
+        "popularity",
+        "effective_price",
+        "search_vector",
+    ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get("update_fields"):
+            # never write back maintained values that may have moved since loading
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.maintained_fields
+            ]
+        super().save(*args, **kwargs)
+
 
 class ProductImage(models.Model):
-    image = models.ImageField(upload_to="store/images")
+    # stored once per distinct file, shared between rows with equal content
+    image = models.ImageField(
+        upload_to="store/images", storage=storage.image_storage, db_index=True
+    )
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="images"
     )
+    # sha256 of the file, set with variants_ready by store.variants
+    digest = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    variants_ready = models.BooleanField(default=False, editable=False)
+
+    def save(self, *args, **kwargs):
+        # the storage locks the file it reuses, hold that until the row commits
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class StoredFile(models.Model):
+    """Lock row for a file or variant directory shared by ProductImage rows
+
+    Storing, marking ready and releasing shared content hold it, see
+    store.storage.lock and store.variants.release.
+    """
+
+    name = models.CharField(max_length=255, primary_key=True)
 
 
 class Customer(models.Model):
@@ -85,15 +164,31 @@ class Order(models.Model):
         max_length=1, choices=PAYMENT_STATUS_CHOICES, default="P"
     )
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
+    # stored when the order is placed, see store.orders
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    subtotal = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, editable=False
+    )
+    total = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["customer", "placed_at", "id"]),
+            models.Index(fields=["placed_at", "id"]),
+        ]
 
 
 class OrderItem(models.Model):
     quantity = models.PositiveSmallIntegerField()
-    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2)
     order = models.ForeignKey(Order, on_delete=models.PROTECT, related_name="items")
     product = models.ForeignKey(
         Product, on_delete=models.PROTECT, related_name="order_item_set"
     )
+    # product title when ordered
+    title = models.CharField(max_length=255, blank=True, editable=False)
 
     class Meta:
         permissions = [
@@ -110,6 +205,8 @@ class Address(models.Model):
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
+    # touched by every item write, carts idle past CART_TTL are reaped
+    last_activity = models.DateTimeField(auto_now=True)
 
 
 class CartItem(models.Model):
@@ -129,5 +226,48 @@ class Review(models.Model):
         Product, on_delete=models.CASCADE, related_name="reviews"
     )
 
+    class Meta:
+        indexes = [models.Index(fields=["product", "date", "id"])]
+
     def __str__(self) -> str:
         return self.name
+
+
+class RelatedProduct(models.Model):
+    """Top neighbours of a product by orders containing both, see store.related"""
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    orders = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [["product", "related"]]
+        indexes = [models.Index(fields=["product", "-orders"])]
+
+
+class OutboxEvent(models.Model):
+    """One delivery of a published event to one handler, see store.outbox"""
+
+    STATUS_CHOICES = [
+        ("P", "Pending"),
+        ("D", "Done"),
+        ("F", "Failed"),
+    ]
+
+    topic = models.CharField(max_length=100)
+    handler = models.CharField(max_length=255)
+    payload = models.JSONField()
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default="P")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # next attempt, pushed forward by the claim lease and the retry backoff
+    available_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claim = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "available_at", "id"])]
+
+    def __str__(self):
+        return f"{self.topic} -> {self.handler}"
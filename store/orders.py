@@ -0,0 +1,81 @@
+"""Order summaries stored once, so history and reports read plain columns
+
+Order.item_count, subtotal (before tax) and total (what was charged) and
+OrderItem.title are filled in by CreateOrderSerializer from the lines it
+creates. ``refresh`` recomputes them from stored lines, for orders edited
+in the admin and for the backfill_order_totals command.
+
+Lines of orders placed before migration 0011 store the pre-tax price and
+nothing more was charged, so their subtotal and total are the plain sum.
+"""
+
+from decimal import Decimal
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef
+from django.db.models import Subquery, Sum
+from django.db.migrations.recorder import MigrationRecorder
+from store import models, pricing
+
+
+def totals(lines):
+    """``item_count``, ``subtotal`` and ``total`` of a list of OrderItems"""
+    total = sum((line.unit_price * line.quantity for line in lines), Decimal(0))
+    return {
+        "item_count": sum(line.quantity for line in lines),
+        "subtotal": pricing.without_tax(total),
+        "total": total.quantize(pricing.CENT),
+    }
+
+
+def tax_included_since():
+    """When OrderItem.unit_price started to include tax, None if unknown"""
+    return (
+        MigrationRecorder.Migration.objects.filter(
+            app="store", name="0011_effective_price"
+        )
+        .values_list("applied", flat=True)
+        .first()
+    )
+
+
+def refresh(order_ids):
+    """Snapshot missing item titles and store the totals of ``order_ids``"""
+    items = models.OrderItem.objects.filter(order_id__in=order_ids)
+    items.filter(title="").update(
+        title=Subquery(
+            models.Product.objects.filter(pk=OuterRef("product_id")).values("title")
+        )
+    )
+
+    sums = {
+        row["order_id"]: row
+        for row in items.order_by()
+        .values("order_id", "order__placed_at")
+        .annotate(
+            count=Sum("quantity"),
+            total=Sum(
+                ExpressionWrapper(
+                    F("quantity") * F("unit_price"),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                )
+            ),
+        )
+    }
+    since = tax_included_since()
+    orders = []
+    for order_id in order_ids:
+        row = sums.get(order_id, {"count": 0, "total": Decimal(0)})
+        total = Decimal(row["total"])
+        if since is not None and row.get("order__placed_at", since) < since:
+            subtotal = total
+        else:
+            subtotal = pricing.without_tax(total)
+        orders.append(
+            models.Order(
+                pk=order_id,
+                item_count=row["count"],
+                subtotal=subtotal.quantize(pricing.CENT),
+                total=total.quantize(pricing.CENT),
+            )
+        )
+    models.Order.objects.bulk_update(orders, ["item_count", "subtotal", "total"])
+    return len(orders)
@@ -0,0 +1,144 @@
+"""Transactional outbox for side effects of store writes
+
+``publish`` writes one OutboxEvent row per handler registered for the topic,
+in the caller's transaction, so the events exist exactly when the write
+commits. The run_outbox command claims pending rows in batches and calls
+their handler after the request is long gone; failures are retried with
+exponential backoff until OUTBOX["MAX_ATTEMPTS"], then kept as Failed.
+
+Delivery is at least once, handlers must tolerate being called again with
+the same payload.
+"""
+
+import traceback
+from datetime import timedelta
+from functools import partial
+from uuid import uuid4
+from django.db import connection, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from store import models, conf
+
+DEFAULTS = {"MAX_ATTEMPTS": 8, "BACKOFF": 2, "MAX_BACKOFF": 60 * 60, "LEASE": 60 * 5}
+get_setting = partial(conf.get_setting, "OUTBOX", DEFAULTS)
+
+PENDING, DONE, FAILED = "P", "D", "F"
+
+handlers = {}
+
+
+def handler(topic):
+    """Register ``function(payload)`` for events published on ``topic``"""
+
+    def register(function):
+        handlers[f"{function.__module__}.{function.__qualname__}"] = (topic, function)
+        return function
+
+    return register
+
+
+def publish(topic, payload):
+    """Queue ``payload`` for every handler of ``topic``, call inside the write's transaction"""
+    models.OutboxEvent.objects.bulk_create(
+        [
+            models.OutboxEvent(topic=topic, handler=name, payload=payload)
+            for name, (handler_topic, _) in sorted(handlers.items())
+            if handler_topic == topic
+        ]
+    )
+
+
+def claim(batch_size=100):
+    """Lease up to ``batch_size`` due events to this worker, oldest first
+
+    Rows are locked with SKIP LOCKED where the database has it, so workers
+    never wait on each other. Elsewhere (SQLite) the conditional UPDATE
+    alone decides who gets a row: once leased its available_at has moved
+    past ``now`` and no other worker's UPDATE matches it.
+    """
+    now = timezone.now()
+    due = models.OutboxEvent.objects.filter(status=PENDING, available_at__lte=now)
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            return lease(due.select_for_update(skip_locked=True), now, batch_size)
+    return lease(due, now, batch_size)
+
+
+def lease(due, now, batch_size):
+    token = uuid4()
+    ids = list(due.order_by("id").values_list("pk", flat=True)[:batch_size])
+    models.OutboxEvent.objects.filter(
+        pk__in=ids, status=PENDING, available_at__lte=now
+    ).update(
+        claim=token,
+        available_at=now + timedelta(seconds=get_setting("LEASE")),
+        attempts=F("attempts") + 1,
+    )
+    return list(
+        models.OutboxEvent.objects.filter(pk__in=ids, claim=token).order_by("id")
+    )
+
+
+def backoff(attempts):
+    return min(get_setting("BACKOFF") * 2 ** (attempts - 1), get_setting("MAX_BACKOFF"))
+
+
+def dispatch(event):
+    """Run the event's handler, returns whether it went through
+
+    The handler's own writes commit together with the Done status, so
+    handlers that only touch the database run exactly once.
+    """
+    now = timezone.now()
+    try:
+        _, function = handlers[event.handler]
+        with transaction.atomic():
+            function(event.payload)
+            models.OutboxEvent.objects.filter(pk=event.pk, claim=event.claim).update(
+                status=DONE, processed_at=now
+            )
+    except Exception:
+        error = traceback.format_exc()
+        if event.attempts >= get_setting("MAX_ATTEMPTS"):
+            changes = {"status": FAILED, "processed_at": now}
+        else:
+            changes = {"available_at": now + timedelta(seconds=backoff(event.attempts))}
+        models.OutboxEvent.objects.filter(pk=event.pk, claim=event.claim).update(
+            last_error=error, **changes
+        )
+        return False
+    return True
+
+
+def process(batch_size=100):
+    """Claim and dispatch one batch, returns ``(events, delivered)``"""
+    events = claim(batch_size)
+    delivered = sum(dispatch(event) for event in events)
+    return events, delivered
+
+
+def stats():
+    """Backlog size, failures and the age in seconds of the oldest due event"""
+    now = timezone.now()
+    counts = dict(
+        models.OutboxEvent.objects.exclude(status=DONE)
+        .order_by()
+        .values_list("status")
+        .annotate(count=Count("pk"))
+    )
+    oldest = models.OutboxEvent.objects.filter(
+        status=PENDING, available_at__lte=now
+    ).aggregate(oldest=Min("created_at"))["oldest"]
+    return {
+        "pending": counts.get(PENDING, 0),
+        "failed": counts.get(FAILED, 0),
+        "lag": (now - oldest).total_seconds() if oldest else 0.0,
+    }
+
+
+def purge(before):
+    """Delete delivered events processed before ``before``"""
+    deleted, _ = models.OutboxEvent.objects.filter(
+        status=DONE, processed_at__lt=before
+    ).delete()
+    return deleted
@@ -1,9 +1,280 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from datetime import datetime
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.pagination import _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
-class ProductPagination(PageNumberPagination):
+class CursorEncoder(DjangoJSONEncoder):
+    """Keeps microseconds, positions have to compare equal to the stored values"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """Seek-method pagination: every page is one range scan, no OFFSET.
+
+    The ordering comes from the view's OrderingFilter (falling back to
+    ``ordering``) and always ends with ``id`` so the position is unique.
+    NULL sorts above every value on all databases, as PostgreSQL does by
+    default, so nullable fields such as effective_price page through too.
+    The total count is included unless the client sends ``?count=false``
+    (or, with ``count_by_default = False``, unless it sends ``?count=true``).
+    """
+
+    page_size = 3
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    ordering = ["id"]
+    count_by_default = True
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.nullable = self.get_nullable(queryset.model, self.ordering)
+        position, reverse = self.decode_cursor(request)
+
+        self.count = queryset.count() if self.include_count(request) else None
+
+        ordering = (
+            [self.flip(field) for field in self.ordering] if reverse else self.ordering
+        )
+        queryset = queryset.order_by(*self.order_by(ordering))
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(ordering, position))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        response = {}
+        if self.count is not None:
+            response["count"] = self.count
+        response["next"] = self.get_next_link()
+        response["previous"] = self.get_previous_link()
+        response["results"] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer", "example": 123},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def include_count(self, request):
+        value = request.query_params.get(self.count_query_param)
+        if value is None:
+            return self.count_by_default
+        return value.lower() not in ("0", "false", "no")
+
+    def get_default_ordering(self, queryset):
+        # a ?search= keeps the relevance order ProductSearchFilter gave it
+        if "search_rank" in queryset.query.annotations:
+            return ["-search_rank"]
+        return list(self.ordering)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = self.get_default_ordering(queryset)
+        for backend in getattr(view, "filter_backends", []):
+            if issubclass(backend, OrderingFilter):
+                ordering = list(
+                    backend().get_ordering(request, queryset, view) or ordering
+                )
+                break
+
+        if not any(field.lstrip("-") in ("id", "pk") for field in ordering):
+            ordering.append("-id" if ordering[-1].startswith("-") else "id")
+        return ordering
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def get_nullable(self, model, ordering):
+        """Ordering fields that may hold NULL, anything not a plain column counts"""
+        nullable = set()
+        for field in ordering:
+            name = field.lstrip("-")
+            if name == "pk":
+                continue
+            try:
+                if not model._meta.get_field(name).null:
+                    continue
+            except FieldDoesNotExist:
+                pass
+            nullable.add(name)
+        return nullable
+
+    def order_by(self, ordering):
+        expressions = []
+        for field in ordering:
+            name = field.lstrip("-")
+            if name not in self.nullable:
+                expressions.append(field)
+            elif field.startswith("-"):
+                expressions.append(F(name).desc(nulls_first=True))
+            else:
+                expressions.append(F(name).asc(nulls_last=True))
+        return expressions
+
+    def after(self, field, value, inclusive=False):
+        """Rows past ``value`` in ``field``'s direction, NULL being the largest"""
+        name = field.lstrip("-")
+        descending = field.startswith("-")
+        lookup = ("lt" if descending else "gt") + ("e" if inclusive else "")
+        if name not in self.nullable:
+            return Q(**{f"{name}__{lookup}": value})
+        if value is None:
+            if descending:
+                return Q() if inclusive else Q(**{f"{name}__isnull": False})
+            return Q(**{f"{name}__isnull": True}) if inclusive else Q(pk__in=[])
+        condition = Q(**{f"{name}__{lookup}": value})
+        return condition if descending else condition | Q(**{f"{name}__isnull": True})
+
+    def equal(self, field, value):
+        name = field.lstrip("-")
+        if value is None:
+            return Q(**{f"{name}__isnull": True})
+        return Q(**{name: value})
+
+    def seek_filter(self, ordering, position):
+        """(a, b, id) > (x, y, z) spelled out so the leading index column bounds the scan"""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            step = self.after(field, position[index])
+            for previous, value in zip(ordering[:index], position):
+                step &= self.equal(previous, value)
+            condition |= step
+
+        return self.after(ordering[0], position[0], inclusive=True) & condition
+
+    def get_position(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field.lstrip("-")] for field in self.ordering]
+        return [getattr(obj, field.lstrip("-")) for field in self.ordering]
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps(
+            {"o": self.ordering, "p": position, "r": reverse}, cls=CursorEncoder
+        )
+        token = urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+
+        try:
+            payload = json.loads(urlsafe_b64decode(token.encode()).decode())
+            position, reverse = payload["p"], bool(payload["r"])
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if payload.get("o") != self.ordering or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.get_position(self.page[0]), True)
+
+
+class KeysetModeMixin:
+    """Switch a page-number paginator to keyset mode when ``?cursor`` is sent"""
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            self.display_page_controls = False
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class ProductKeysetPagination(KeysetPagination):
+    page_size = 3
+
+
+class CollectionKeysetPagination(KeysetPagination):
+    page_size = 2
+
+
+class ReviewPagination(KeysetPagination):
+    """Newest first, the product's review_count stands in for the count"""
+
+    page_size = 10
+    ordering = ["-date"]
+    count_by_default = False
+
+
+class OrderPagination(KeysetPagination):
+    """Newest first on (placed_at, id), served by the (customer, placed_at) index"""
+
+    page_size = 10
+    ordering = ["-placed_at"]
+    count_by_default = False
+
+
+class ProductPagination(KeysetModeMixin, PageNumberPagination):
     page_size = 3
+    keyset_class = ProductKeysetPagination
 
 
-class CollectionPagination(PageNumberPagination):
+class CollectionPagination(KeysetModeMixin, PageNumberPagination):
     page_size = 2
+    keyset_class = CollectionKeysetPagination
@@ -0,0 +1,72 @@
+"""Bestseller score stored on Product.popularity
+
+Units sold in the last WINDOW_DAYS, each weighted by ``0.5 ** (age /
+HALF_LIFE_DAYS)``, plus LIKE_WEIGHT per like. Recomputed by the
+update_popularity command, so ordering by it is a plain index scan.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from likes.models import LikeItem
+from store import models, cache
+
+HALF_LIFE_DAYS = 14
+WINDOW_DAYS = 90
+LIKE_WEIGHT = 0.5
+
+
+def sales(now, half_life=HALF_LIFE_DAYS, window=WINDOW_DAYS, chunk_size=5000):
+    scores = defaultdict(float)
+    items = (
+        models.OrderItem.objects.filter(order__placed_at__gte=now - timedelta(window))
+        .values_list("product_id", "quantity", "order__placed_at")
+        .iterator(chunk_size=chunk_size)
+    )
+    for product_id, quantity, placed_at in items:
+        age = (now - placed_at).total_seconds() / 86400
+        scores[product_id] += quantity * 0.5 ** (age / half_life)
+    return scores
+
+
+def likes():
+    return dict(
+        LikeItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(models.Product)
+        )
+        .order_by()
+        .values_list("object_id")
+        .annotate(count=Count("pk"))
+    )
+
+
+def scores(now=None, half_life=HALF_LIFE_DAYS, window=WINDOW_DAYS):
+    now = now or timezone.now()
+    scores = sales(now, half_life, window)
+    for product_id, count in likes().items():
+        scores[product_id] += LIKE_WEIGHT * count
+    return {product_id: round(score, 3) for product_id, score in scores.items()}
+
+
+def update(half_life=HALF_LIFE_DAYS, window=WINDOW_DAYS, batch_size=1000):
+    """Store fresh scores, writing only the products whose score moved"""
+    now = timezone.now()
+    fresh = scores(now, half_life, window)
+    changed = []
+    for pk, popularity in models.Product.objects.values_list(
+        "pk", "popularity"
+    ).iterator(chunk_size=batch_size):
+        score = fresh.get(pk, 0.0)
+        if score != popularity:
+            changed.append(models.Product(pk=pk, popularity=score, last_update=now))
+
+    with transaction.atomic():
+        models.Product.objects.bulk_update(
+            changed, ["popularity", "last_update"], batch_size=batch_size
+        )
+    if changed:
+        cache.bump(models.Product)
+    return len(changed)
@@ -0,0 +1,89 @@
+from decimal import Decimal
+from django.db.models import DecimalField, ExpressionWrapper, F, Max
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round
+from django.utils import timezone
+from store import models, cache
+
+TAX_RATE = Decimal("1.2")
+CENT = Decimal(".01")
+
+
+def with_tax(price):
+    return price * TAX_RATE
+
+
+def without_tax(price):
+    return (price / TAX_RATE).quantize(CENT)
+
+
+def best_discount():
+    """Largest discount among a product's promotions, 0 when it has none"""
+    discounts = (
+        models.Product.promotions.through.objects.filter(product_id=OuterRef("pk"))
+        .order_by()
+        .values("product_id")
+        .annotate(best=Max("promotions__discount"))
+        .values("best")
+    )
+    return Cast(
+        Coalesce(Subquery(discounts), Value(0.0)),
+        DecimalField(max_digits=5, decimal_places=4),
+    )
+
+
+def effective_price():
+    """SQL expression for what the customer pays: best promotion, then tax"""
+    return Round(
+        F("price") * (Value(1) - best_discount()) * Value(TAX_RATE),
+        2,
+        output_field=DecimalField(max_digits=8, decimal_places=2),
+    )
+
+
+def refresh(product_ids=None):
+    """Recompute Product.effective_price in one UPDATE, call after bulk writes"""
+    queryset = models.Product.objects.all()
+    if product_ids is not None:
+        queryset = queryset.filter(pk__in=product_ids)
+    updated = queryset.update(
+        effective_price=effective_price(), last_update=timezone.now()
+    )
+    cache.bump(models.Product)
+    return updated
+
+
+def unit_price(product):
+    """Price charged in carts and orders, falling back to price after tax
+    for rows written in bulk that have not been refreshed yet"""
+    if product.effective_price is None:
+        return with_tax(product.price).quantize(CENT)
+    return product.effective_price
+
+
+def unit_price_expression(product="product"):
+    """``unit_price`` as SQL, for the product behind the ``product`` path
+    or the queried product itself when ``product`` is None"""
+    prefix = f"{product}__" if product else ""
+    return Coalesce(
+        F(f"{prefix}effective_price"),
+        Round(F(f"{prefix}price") * Value(TAX_RATE), 2),
+        output_field=DecimalField(max_digits=8, decimal_places=2),
+    )
+
+
+def line_total(quantity="quantity", product="product"):
+    """quantity times unit price of one cart or order line, in SQL"""
+    return ExpressionWrapper(
+        F(quantity) * unit_price_expression(product),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def total(quantity="quantity", product="product"):
+    """Sum of line_total over the lines being aggregated, 0 when there are none"""
+    return Coalesce(
+        Sum(line_total(quantity, product)),
+        Value(Decimal(0)),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
@@ -0,0 +1,91 @@
+"""Frequently bought together: product pairs counted over orders
+
+``rebuild()`` recounts the whole OrderItem history, ``record_order()``
+folds a new order in. Only the TOP_K neighbours of each product are kept,
+so incremental counts for pairs outside the top are approximate until the
+next rebuild.
+"""
+
+import heapq
+from collections import Counter, defaultdict
+from itertools import combinations, groupby
+from operator import itemgetter
+from django.db import transaction
+from store import models, cache, upserts
+
+TOP_K = 10
+
+
+def pairs(product_ids):
+    """Both directions of every pair of distinct products in a basket"""
+    for a, b in combinations(sorted(set(product_ids)), 2):
+        yield a, b
+        yield b, a
+
+
+def count_pairs(chunk_size=5000):
+    """``{product_id: Counter({related_id: orders})}`` over all orders
+
+    Streams OrderItem ordered by order so that one basket is in memory at
+    a time, the counters themselves only hold pairs that occur.
+    """
+    counts = defaultdict(Counter)
+    items = (
+        models.OrderItem.objects.order_by("order_id")
+        .values_list("order_id", "product_id")
+        .iterator(chunk_size=chunk_size)
+    )
+    for _, basket in groupby(items, key=itemgetter(0)):
+        for product_id, related_id in pairs(product_id for _, product_id in basket):
+            counts[product_id][related_id] += 1
+    return counts
+
+
+def top(counts, top_k):
+    for product_id, related in counts.items():
+        for related_id, orders in heapq.nlargest(
+            top_k, related.items(), key=lambda pair: (pair[1], -pair[0])
+        ):
+            yield models.RelatedProduct(
+                product_id=product_id, related_id=related_id, orders=orders
+            )
+
+
+def rebuild(top_k=TOP_K, chunk_size=5000):
+    """Replace the whole table, returns the number of rows written"""
+    rows = list(top(count_pairs(chunk_size), top_k))
+    with transaction.atomic():
+        models.RelatedProduct.objects.all().delete()
+        models.RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+    cache.bump(models.RelatedProduct)
+    return len(rows)
+
+
+@transaction.atomic
+def record_order(order_id, top_k=TOP_K):
+    """Add the pairs of one order, then trim its products back to top_k"""
+    product_ids = set(
+        models.OrderItem.objects.filter(order_id=order_id).values_list(
+            "product_id", flat=True
+        )
+    )
+    if len(product_ids) < 2:
+        return
+
+    upserts.add(
+        "store_relatedproduct",
+        ["product_id", "related_id"],
+        "orders",
+        [(product_id, related_id, 1) for product_id, related_id in pairs(product_ids)],
+    )
+
+    rows = models.RelatedProduct.objects.filter(product__in=product_ids).values_list(
+        "product_id", "pk", "orders", "related_id"
+    )
+    surplus = []
+    for _, group in groupby(sorted(rows), key=itemgetter(0)):
+        group = sorted(group, key=lambda row: (-row[2], row[3]))
+        surplus.extend(row[1] for row in group[top_k:])
+    if surplus:
+        models.RelatedProduct.objects.filter(pk__in=surplus).delete()
+    cache.bump(models.RelatedProduct)
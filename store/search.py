@@ -0,0 +1,148 @@
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from store import models
+
+
+def tokenize(terms):
+    return re.findall(r"\w+", terms.lower())
+
+
+def chunked(ids, size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start : start + size]
+
+
+class PostgresProductSearch:
+    """tsvector stored in Product.search_vector, backed by a GIN index"""
+
+    config = "english"
+
+    def vector(self):
+        return SearchVector("title", weight="A", config=self.config) + SearchVector(
+            "description", weight="B", config=self.config
+        )
+
+    def reindex(self, product_ids=None):
+        if product_ids is None:
+            models.Product.objects.update(search_vector=self.vector())
+            return
+        for chunk in chunked(product_ids):
+            models.Product.objects.filter(pk__in=chunk).update(
+                search_vector=self.vector()
+            )
+
+    def remove(self, product_ids):
+        pass
+
+    def search(self, queryset, terms):
+        tokens = tokenize(terms)
+        if not tokens:
+            return queryset.none()
+        query = SearchQuery(
+            " & ".join(f"{token}:*" for token in tokens),
+            search_type="raw",
+            config=self.config,
+        )
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(search_rank=SearchRank(F("search_vector"), query))
+            .order_by("-search_rank", "id")
+        )
+
+
+class SQLiteProductSearch:
+    """FTS5 shadow table keyed by product id, used for local development"""
+
+    table = "store_product_fts"
+
+    def reindex(self, product_ids=None):
+        with connection.cursor() as cursor:
+            if product_ids is None:
+                cursor.execute(f"DELETE FROM {self.table}")
+                cursor.execute(
+                    f"INSERT INTO {self.table} (rowid, title, description) "
+                    f"SELECT id, title, description FROM store_product"
+                )
+                return
+            for chunk in chunked(product_ids):
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(
+                    f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", chunk
+                )
+                cursor.execute(
+                    f"INSERT INTO {self.table} (rowid, title, description) "
+                    f"SELECT id, title, description FROM store_product "
+                    f"WHERE id IN ({placeholders})",
+                    chunk,
+                )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            for chunk in chunked(product_ids):
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(
+                    f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", chunk
+                )
+
+    def search(self, queryset, terms):
+        tokens = tokenize(terms)
+        if not tokens:
+            return queryset.none()
+        query = " ".join(f'"{token}"*' for token in tokens)
+        rank = RawSQL(
+            f"SELECT -bm25({self.table}) FROM {self.table} "
+            f"WHERE {self.table} MATCH %s AND rowid = store_product.id",
+            [query],
+            output_field=FloatField(),
+        )
+        matches = RawSQL(
+            f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [query]
+        )
+        return (
+            queryset.filter(id__in=matches)
+            .annotate(search_rank=rank)
+            .order_by("-search_rank", "id")
+        )
+
+
+class BasicProductSearch:
+    """Unindexed fallback for other databases"""
+
+    def reindex(self, product_ids=None):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def search(self, queryset, terms):
+        condition = Q()
+        for token in tokenize(terms):
+            condition &= Q(title__icontains=token) | Q(description__icontains=token)
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+
+def get_backend():
+    if connection.vendor == "postgresql":
+        return PostgresProductSearch()
+    if connection.vendor == "sqlite":
+        return SQLiteProductSearch()
+    return BasicProductSearch()
+
+
+def reindex(product_ids=None):
+    """Refresh the search index, call after bulk writes that skip signals"""
+    get_backend().reindex(product_ids)
+
+
+def remove(product_ids):
+    get_backend().remove(product_ids)
+
+
+def search_products(queryset, terms):
+    return get_backend().search(queryset, terms)
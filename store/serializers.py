@@ -1,8 +1,10 @@
-from django.db import transaction
-from rest_framework import serializers
-from store import models
 from decimal import Decimal
-from store.signals import order_created
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, Max, Min, Value
+from django.db.models.functions import Round
+from rest_framework import exceptions, serializers
+from store import models, carts, flashsale, inventory, orders, outbox, pricing
+from store import search, variants
 
 
 class CollectionSerializer(serializers.ModelSerializer):
@@ -18,10 +20,15 @@ class CollectionSerializer(serializers.ModelSerializer):
 class ProductImageSerializer(serializers.ModelSerializer):
 
     product = serializers.CharField(read_only=True)
+    variants = serializers.SerializerMethodField()
 
     class Meta:
         model = models.ProductImage
-        fields = ["id", "product", "image"]
+        fields = ["id", "product", "image", "variants"]
+
+    def get_variants(self, image):
+        digest = image.digest if image.variants_ready else None
+        return variants.variant_urls(digest, self.context.get("request"))
 
     def create(self, validated_data):
         product_id = self.context["product_id"]
@@ -44,27 +51,376 @@ class ProductSerializer(serializers.ModelSerializer):
             "title",
             "price",
             "price_after_tax",
+            "effective_price",
             "inventory",
             "collection",
             "collection_name",
             "description",
+            "review_count",
+            "latest_review_at",
             "images",
         ]
+        read_only_fields = ["review_count", "latest_review_at"]
 
     def calculate_tax(self, pro):
-        return pro.price * Decimal(1.2)
+        return pricing.with_tax(pro.price)
+
+
+class ProductRowListSerializer(serializers.ListSerializer):
+    """Fetch the images of a whole page in one query"""
+
+    def to_representation(self, data):
+        rows = list(data)
+        images = self.child.fetch_images([row["id"] for row in rows])
+        return [self.child.build(row, images) for row in rows]
+
+
+class ProductReadSerializer(serializers.BaseSerializer):
+    """Read-only ProductSerializer producing the same output from ``.values()`` rows
+
+    Skips per-field ``to_representation`` dispatch and model instantiation,
+    use ``rows()`` to turn a Product queryset into the expected row shape.
+    """
+
+    row_fields = [
+        "id",
+        "title",
+        "price",
+        "effective_price",
+        "inventory",
+        "collection_id",
+        "collection__title",
+        "description",
+        "review_count",
+        "latest_review_at",
+        # not rendered, read by keyset cursors on ?ordering=popularity
+        "popularity",
+    ]
+    image_storage = models.ProductImage._meta.get_field("image").storage
+    datetime_field = serializers.DateTimeField()
+
+    class Meta:
+        list_serializer_class = ProductRowListSerializer
+
+    @classmethod
+    def rows(cls, queryset):
+        return queryset.values(*cls.row_fields)
+
+    def fetch_images(self, product_ids):
+        images = {}
+        for image in models.ProductImage.objects.filter(
+            product_id__in=product_ids
+        ).values_list("product_id", "id", "image", "digest", "variants_ready"):
+            images.setdefault(image[0], []).append(image[1:])
+        return images
+
+    def image_url(self, name):
+        if not name:
+            return None
+        url = self.image_storage.url(name)
+        request = self.context.get("request")
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def build(self, row, images):
+        title = row["title"]
+        effective_price = row["effective_price"]
+        return {
+            "id": row["id"],
+            "title": title,
+            "price": row["price"].quantize(pricing.CENT),
+            "price_after_tax": pricing.with_tax(row["price"]),
+            "effective_price": (
+                None
+                if effective_price is None
+                else effective_price.quantize(pricing.CENT)
+            ),
+            "inventory": row["inventory"],
+            "collection": row["collection_id"],
+            "collection_name": row["collection__title"],
+            "description": row["description"],
+            "review_count": row["review_count"],
+            "latest_review_at": (
+                None
+                if row["latest_review_at"] is None
+                else self.datetime_field.to_representation(row["latest_review_at"])
+            ),
+            "images": [
+                {
+                    "id": image_id,
+                    "product": title,
+                    "image": self.image_url(name),
+                    "variants": variants.variant_urls(
+                        digest if ready else None, self.context.get("request")
+                    ),
+                }
+                for image_id, name, digest, ready in images.get(row["id"], [])
+            ],
+        }
+
+    def to_representation(self, row):
+        return self.build(row, self.fetch_images([row["id"]]))
+
+
+class BulkProductUpsertSerializer(serializers.ModelSerializer):
+    """Creates a product, or replaces the given fields of the one with ``id``
+
+    Creates need every field but ``slug``, updates only the ones they change.
+    """
+
+    id = serializers.IntegerField(required=False)
+    collection = serializers.IntegerField(source="collection_id", required=False)
+
+    create_fields = ["title", "description", "price", "inventory", "collection"]
+
+    class Meta:
+        model = models.Product
+        fields = [
+            "id",
+            "title",
+            "slug",
+            "description",
+            "price",
+            "inventory",
+            "collection",
+        ]
+        extra_kwargs = {
+            "title": {"required": False},
+            "description": {"required": False},
+            "price": {"required": False},
+            "inventory": {"required": False},
+        }
+
+    def validate(self, data):
+        if "id" not in data:
+            missing = {
+                name: ["This field is required."]
+                for name in self.create_fields
+                if self.fields[name].source not in data
+            }
+            if missing:
+                raise serializers.ValidationError(missing)
+        return data
+
+
+class BulkPriceChangeSerializer(serializers.Serializer):
+    """Moves the price of the products in ``ids`` and/or ``collection``
+    by ``percent`` or by an absolute ``amount``"""
+
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    collection = serializers.IntegerField(required=False)
+    percent = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
+    amount = serializers.DecimalField(max_digits=6, decimal_places=2, required=False)
+
+    def validate(self, data):
+        if ("percent" in data) == ("amount" in data):
+            raise serializers.ValidationError("Give exactly one of percent or amount")
+        if not data.get("ids") and "collection" not in data:
+            raise serializers.ValidationError("Give ids, a collection or both")
+        return data
+
+    @staticmethod
+    def products(change):
+        queryset = models.Product.objects.all()
+        if change.get("ids"):
+            queryset = queryset.filter(pk__in=change["ids"])
+        if "collection" in change:
+            queryset = queryset.filter(collection_id=change["collection"])
+        return queryset
+
+    @staticmethod
+    def new_price(change):
+        if "amount" in change:
+            return F("price") + Value(change["amount"])
+        return Round(
+            F("price") * Value(1 + change["percent"] / 100),
+            2,
+            output_field=DecimalField(max_digits=6, decimal_places=2),
+        )
+
+
+class BulkProductSerializer(serializers.Serializer):
+    """Product upserts, price changes and deletes applied in one transaction
+
+    Validation runs a fixed number of queries plus one per price change,
+    price changes are applied first, then upserts, then deletes. ``save()``
+    returns one result per item.
+    """
+
+    upserts = BulkProductUpsertSerializer(many=True, required=False)
+    price_changes = BulkPriceChangeSerializer(many=True, required=False)
+    deletes = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    max_price = Decimal("9999.99")
+
+    def validate(self, data):
+        upserts = data.setdefault("upserts", [])
+        changes = data.setdefault("price_changes", [])
+        deletes = data.setdefault("deletes", [])
+        if not (upserts or changes or deletes):
+            raise serializers.ValidationError("Nothing to do")
+
+        product_ids = {upsert["id"] for upsert in upserts if "id" in upsert}
+        product_ids.update(pk for change in changes for pk in change.get("ids", []))
+        product_ids.update(deletes)
+        existing = set(
+            models.Product.objects.filter(pk__in=product_ids).values_list(
+                "pk", flat=True
+            )
+        )
+        collection_ids = {
+            upsert["collection_id"] for upsert in upserts if "collection_id" in upsert
+        }
+        collection_ids.update(
+            change["collection"] for change in changes if "collection" in change
+        )
+        collections = set(
+            models.Collection.objects.filter(pk__in=collection_ids).values_list(
+                "pk", flat=True
+            )
+        )
+        ordered = set(
+            models.OrderItem.objects.filter(product_id__in=deletes)
+            .values_list("product_id", flat=True)
+            .distinct()
+        )
+
+        errors = {
+            "upserts": self.upsert_errors(upserts, existing, collections, deletes),
+            "price_changes": [
+                self.price_change_errors(change, existing, collections)
+                for change in changes
+            ],
+            "deletes": self.delete_errors(deletes, existing, ordered),
+        }
+        if any(any(items) for items in errors.values()):
+            raise serializers.ValidationError(errors)
+        return data
+
+    def upsert_errors(self, upserts, existing, collections, deletes):
+        seen, errors = set(), []
+        for upsert in upserts:
+            item = {}
+            if "id" in upsert:
+                if upsert["id"] not in existing:
+                    item["id"] = [f"Product {upsert['id']} does not exist"]
+                elif upsert["id"] in seen or upsert["id"] in deletes:
+                    item["id"] = [f"Product {upsert['id']} appears more than once"]
+                seen.add(upsert["id"])
+            if "collection_id" in upsert and upsert["collection_id"] not in collections:
+                item["collection"] = [
+                    f"Collection {upsert['collection_id']} does not exist"
+                ]
+            errors.append(item)
+        return errors
+
+    def price_change_errors(self, change, existing, collections):
+        item = {}
+        missing = [pk for pk in change.get("ids", []) if pk not in existing]
+        if missing:
+            item["ids"] = [f"Products {missing} do not exist"]
+        if "collection" in change and change["collection"] not in collections:
+            item["collection"] = [f"Collection {change['collection']} does not exist"]
+        if item:
+            return item
+
+        prices = BulkPriceChangeSerializer.products(change).aggregate(
+            low=Min(BulkPriceChangeSerializer.new_price(change)),
+            high=Max(BulkPriceChangeSerializer.new_price(change)),
+        )
+        if prices["low"] is not None and (
+            prices["low"] < 1 or prices["high"] > self.max_price
+        ):
+            item["non_field_errors"] = [
+                f"New prices would range from {prices['low']:.2f} "
+                f"to {prices['high']:.2f}"
+            ]
+        return item
+
+    def delete_errors(self, deletes, existing, ordered):
+        errors = []
+        for pk in deletes:
+            if pk not in existing:
+                errors.append([f"Product {pk} does not exist"])
+            elif pk in ordered:
+                errors.append([f"Product {pk} is still in OrderItems"])
+            else:
+                errors.append([])
+        return errors
+
+    def save(self, **kwargs):
+        data = self.validated_data
+        with transaction.atomic():
+            price_changes = [
+                self.change_price(change) for change in data["price_changes"]
+            ]
+            upserts = self.upsert(data["upserts"])
+            models.Product.objects.filter(pk__in=data["deletes"]).delete()
+        return {
+            "upserts": upserts,
+            "price_changes": price_changes,
+            "deletes": [{"id": pk, "status": "deleted"} for pk in data["deletes"]],
+        }
+
+    def change_price(self, change):
+        products = BulkPriceChangeSerializer.products(change)
+        updated = products.update(price=BulkPriceChangeSerializer.new_price(change))
+        pricing.refresh(products.values("pk"))
+        return {"updated": updated}
+
+    def upsert(self, upserts):
+        products = [models.Product(**upsert) for upsert in upserts]
+        new = [product for product in products if product.pk is None]
+
+        # updates by id only write the fields they were given, one
+        # bulk_update per distinct set of fields
+        changed = {}
+        for upsert, product in zip(upserts, products):
+            fields = tuple(sorted(upsert.keys() - {"id"}))
+            if product.pk is not None and fields:
+                changed.setdefault(fields, []).append(product)
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            models.Product.objects.bulk_create(new)
+        else:
+            for product in new:
+                product.save()
+        for fields, group in changed.items():
+            models.Product.objects.bulk_update(group, fields)
+
+        product_ids = [product.pk for product in products]
+        if product_ids:
+            search.reindex(product_ids)
+            pricing.refresh(product_ids)
+        flashsale.reset(
+            *[product.pk for group in changed.values() for product in group]
+        )
+        created = {id(product) for product in new}
+        return [
+            {
+                "id": product.pk,
+                "status": "created" if id(product) in created else "updated",
+            }
+            for product in products
+        ]
 
 
 class ReviewSerializer(serializers.ModelSerializer):
     """Main ModelSerializer for our Review class"""
 
-    product_name = serializers.CharField(read_only=True, source="product")
+    product_name = serializers.SerializerMethodField()
 
     class Meta:
         model = models.Review
         fields = ["id", "name", "date", "product", "product_name", "description"]
         extra_kwargs = {"product": {"read_only": True}}
 
+    def get_product_name(self, review):
+        # looked up once per request by the view, reviews share one product
+        return self.context["product_name"]
+
+    @transaction.atomic
     def create(self, validated_data):
         product_id = self.context["product_id"]
         return models.Review.objects.create(product_id=product_id, **validated_data)
@@ -75,7 +431,17 @@ class ProductCartItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = models.Product
-        fields = ["id", "title", "price"]
+        fields = ["id", "title", "price", "effective_price"]
+
+
+class RelatedProductSerializer(serializers.ModelSerializer):
+    """A frequently bought together product with its number of shared orders"""
+
+    product = ProductCartItemSerializer(source="related")
+
+    class Meta:
+        model = models.RelatedProduct
+        fields = ["product", "orders"]
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -89,43 +455,60 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ["id", "quantity", "product", "total_price"]
 
     def get_total_price(self, cart_item):
-        return cart_item.product.price * cart_item.quantity
+        # set by the storage, items it did not price are priced here
+        total = getattr(cart_item, "total_price", None)
+        if total is None:
+            total = cart_item.quantity * pricing.unit_price(cart_item.product)
+        return total.quantize(pricing.CENT)
 
     def create(self, validated_data):
         return super().create(validated_data)
 
 
+def add_cart_items(cart_id, quantities):
+    """Upsert ``{product_id: quantity}`` into a cart, as API errors"""
+    try:
+        return carts.get_storage().add_items(cart_id, quantities)
+    except carts.CartNotFound:
+        raise exceptions.NotFound("This shopping cart id is not Valid!")
+    except carts.UnknownProducts as error:
+        raise serializers.ValidationError(
+            {
+                "product_id": [
+                    f"We Do Not have {product_id} as a product id"
+                    for product_id in error.product_ids
+                ]
+            }
+        )
+
+
+class AddCartItemListSerializer(serializers.ListSerializer):
+    """Adds many products in one upsert, repeated products are summed"""
+
+    def save(self, **kwargs):
+        quantities = {}
+        for item in self.validated_data:
+            product_id = item["product_id"]
+            quantities[product_id] = quantities.get(product_id, 0) + item["quantity"]
+        self.instance = add_cart_items(self.context["cart_id"], quantities)
+        return self.instance
+
+
 class AddCartItemSerializer(serializers.ModelSerializer):
+    """Adds to the quantity of the product's item, product ids are checked
+    by the upsert itself"""
 
     product_id = serializers.IntegerField()
 
     class Meta:
         model = models.CartItem
         fields = ["id", "product_id", "quantity"]
-
-    def validate_product_id(self, value):
-        if not models.Product.objects.filter(pk=value):
-            raise serializers.ValidationError(f"We Do Not have {value} as a product id")
-        return value
+        list_serializer_class = AddCartItemListSerializer
 
     def save(self, **kwargs):
         product_id = self.validated_data["product_id"]
-        quantity = self.validated_data["quantity"]
-        cart_id = self.context["cart_id"]
-
-        try:
-            cart_item = models.CartItem.objects.get(
-                product_id=product_id, cart_id=cart_id
-            )
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-
-        except models.CartItem.DoesNotExist:
-            self.instance = models.CartItem.objects.create(
-                cart_id=cart_id, **self.validated_data
-            )
-
+        quantities = {product_id: self.validated_data["quantity"]}
+        self.instance = add_cart_items(self.context["cart_id"], quantities)[0]
         return self.instance
 
 
@@ -135,11 +518,14 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
         model = models.CartItem
         fields = ["quantity"]
 
+    def update(self, instance, validated_data):
+        return carts.get_storage().update_item(instance, validated_data["quantity"])
+
 
 class CartSerializer(serializers.ModelSerializer):
     """Main ModelSerializer for our Cart class"""
 
-    items = CartItemSerializer(many=True, read_only=True)
+    items = CartItemSerializer(many=True, read_only=True, source="cart_items")
     total_price_payment = serializers.SerializerMethodField(
         method_name="get_total_price"
     )
@@ -153,7 +539,20 @@ class CartSerializer(serializers.ModelSerializer):
         }
 
     def get_total_price(self, cart):
-        return sum([item.quantity * item.product.price for item in cart.items.all()])
+        return cart.total_price.quantize(pricing.CENT)
+
+    def create(self, validated_data):
+        return carts.get_storage().create()
+
+
+class CartSummarySerializer(serializers.Serializer):
+    """Item count and total of a cart, for badges that poll"""
+
+    id = serializers.UUIDField()
+    count = serializers.IntegerField()
+    total_price_payment = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="total_price"
+    )
 
 
 class CustomerSerializer(serializers.ModelSerializer):
@@ -170,8 +569,18 @@ class CustomerSerializer(serializers.ModelSerializer):
         ]
 
 
+class OrderItemProductSerializer(serializers.ModelSerializer):
+    """The product as it was ordered, read from the line's snapshot"""
+
+    id = serializers.IntegerField(source="product_id")
+
+    class Meta:
+        model = models.OrderItem
+        fields = ["id", "title"]
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductCartItemSerializer()
+    product = OrderItemProductSerializer(source="*", read_only=True)
 
     class Meta:
         model = models.OrderItem
@@ -188,46 +597,70 @@ class OrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = models.Order
-        fields = ["id", "placed_at", "payment_status", "customer", "items"]
+        fields = [
+            "id",
+            "placed_at",
+            "payment_status",
+            "customer",
+            "item_count",
+            "subtotal",
+            "total",
+            "items",
+        ]
 
 
 class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
     def validate_cart_id(self, cart_id):
-        if not models.Cart.objects.filter(pk=cart_id).exists():
+        self.cart = carts.get_storage().get(cart_id)
+        if self.cart is None:
             raise serializers.ValidationError("This shopping cart id is not Valid!")
 
-        if models.CartItem.objects.filter(cart_id=cart_id).count() == 0:
+        if not self.cart.cart_items:
             raise serializers.ValidationError("You do not have any item in you cart!")
 
         return cart_id
 
     def save(self, **kwargs):
+        quantities = {item.product_id: item.quantity for item in self.cart.cart_items}
+        try:
+            return self.place_order(quantities)
+        except inventory.OutOfStock:
+            raise serializers.ValidationError(
+                {
+                    "cart_id": ["Some products do not have enough inventory"],
+                    "shortfall": inventory.shortfall(quantities),
+                }
+            )
+
+    def place_order(self, quantities):
         with transaction.atomic():
 
             cart_id = self.validated_data["cart_id"]
-
-            customer_id = models.Customer.objects.get(user_id=self.context["user_id"])
-            order = models.Order.objects.create(customer=customer_id)
-            cart_items = models.CartItem.objects.select_related("product").filter(
-                cart_id=cart_id
-            )
+            inventory.reserve(quantities)
 
             order_items = [
                 models.OrderItem(
-                    order=order,
                     product=item.product,
-                    unit_price=item.product.price,
+                    title=item.product.title,
+                    unit_price=pricing.unit_price(item.product),
                     quantity=item.quantity,
                 )
-                for item in cart_items
+                for item in self.cart.cart_items
             ]
 
+            customer_id = models.Customer.objects.get(user_id=self.context["user_id"])
+            order = models.Order.objects.create(
+                customer=customer_id, **orders.totals(order_items)
+            )
+            for order_item in order_items:
+                order_item.order = order
+
             models.OrderItem.objects.bulk_create(order_items)
-            models.Cart.objects.filter(pk=cart_id).delete()
+            carts.get_storage().checked_out(cart_id)
 
-            order_created.send_robust(sender=self.__class__, order=order)
+            outbox.publish("order_created", {"order_id": order.pk})
             return order
 
 
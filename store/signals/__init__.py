@@ -1,3 +0,0 @@
-from django.dispatch import Signal
-
-order_created = Signal()
@@ -1,10 +1,158 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.signals import (
+    pre_save,
+    post_save,
+    pre_delete,
+    post_delete,
+    m2m_changed,
+)
 from django.conf import settings
-from store import models
+from django.utils import timezone
+from store import models, search, cache, flashsale, outbox, pricing, related, variants
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_customer_for_new_user(sender, **kwargs):
     if kwargs["created"]:
         models.Customer.objects.create(user=kwargs["instance"])
+
+
+@receiver(post_save, sender=models.Product)
+def index_product(sender, **kwargs):
+    search.reindex([kwargs["instance"].pk])
+
+
+@receiver(post_delete, sender=models.Product)
+def unindex_product(sender, **kwargs):
+    search.remove([kwargs["instance"].pk])
+
+
+@receiver(post_save, sender=models.Product)
+def reseed_flash_sale(sender, **kwargs):
+    flashsale.reset(kwargs["instance"].pk)
+
+
+@receiver(post_save, sender=models.Product)
+def price_product(sender, **kwargs):
+    instance = kwargs["instance"]
+    pricing.refresh([instance.pk])
+    instance.refresh_from_db(fields=["effective_price", "last_update"])
+
+
+def promoted_product_ids(promotion):
+    return models.Product.promotions.through.objects.filter(
+        promotions=promotion
+    ).values_list("product_id", flat=True)
+
+
+@receiver(m2m_changed, sender=models.Product.promotions.through)
+def price_promoted_products(sender, **kwargs):
+    instance, action = kwargs["instance"], kwargs["action"]
+    if action == "pre_clear":
+        instance._cleared_product_ids = (
+            list(promoted_product_ids(instance)) if kwargs["reverse"] else [instance.pk]
+        )
+    elif action in ("post_add", "post_remove"):
+        pricing.refresh(kwargs["pk_set"] if kwargs["reverse"] else [instance.pk])
+    elif action == "post_clear":
+        pricing.refresh(instance._cleared_product_ids)
+
+
+@receiver(post_save, sender=models.Promotions)
+def price_promotion_products(sender, **kwargs):
+    pricing.refresh(promoted_product_ids(kwargs["instance"]))
+
+
+@receiver(pre_delete, sender=models.Promotions)
+def remember_promotion_products(sender, **kwargs):
+    instance = kwargs["instance"]
+    instance._product_ids = list(promoted_product_ids(instance))
+
+
+@receiver(post_delete, sender=models.Promotions)
+def reprice_promotion_products(sender, **kwargs):
+    pricing.refresh(kwargs["instance"]._product_ids)
+
+
+@receiver(post_save, sender=models.ProductImage)
+def render_image_variants(sender, **kwargs):
+    update_fields = kwargs["update_fields"]
+    if update_fields is None or "image" in update_fields:
+        variants.schedule(kwargs["instance"])
+
+
+@receiver(pre_save, sender=models.ProductImage)
+def remember_image_file(sender, **kwargs):
+    instance = kwargs["instance"]
+    instance.previous_image = None
+    if instance.pk is not None:
+        instance.previous_image = (
+            sender.objects.filter(pk=instance.pk).values_list("image", "digest").first()
+        )
+
+
+@receiver(post_save, sender=models.ProductImage)
+def release_replaced_image_file(sender, **kwargs):
+    previous = getattr(kwargs["instance"], "previous_image", None)
+    if previous and previous[0] != kwargs["instance"].image.name:
+        transaction.on_commit(lambda: variants.release(*previous))
+
+
+@receiver(post_delete, sender=models.ProductImage)
+def release_image_file(sender, **kwargs):
+    instance = kwargs["instance"]
+    name, digest = instance.image.name, instance.digest
+    transaction.on_commit(lambda: variants.release(name, digest))
+
+
+@receiver(post_save, sender=models.ProductImage)
+@receiver(post_delete, sender=models.ProductImage)
+def touch_image_product(sender, **kwargs):
+    models.Product.objects.filter(pk=kwargs["instance"].product_id).update(
+        last_update=timezone.now()
+    )
+
+
+@receiver(post_save, sender=models.Review)
+def count_new_review(sender, **kwargs):
+    if kwargs["created"]:
+        summarize_reviews(kwargs["instance"].product_id, 1)
+
+
+@receiver(post_delete, sender=models.Review)
+def count_deleted_review(sender, **kwargs):
+    summarize_reviews(kwargs["instance"].product_id, -1)
+
+
+def summarize_reviews(product_id, change):
+    latest = (
+        models.Review.objects.filter(product_id=OuterRef("pk"))
+        .order_by()
+        .values("product_id")
+        .annotate(latest=Max("date"))
+        .values("latest")
+    )
+    models.Product.objects.filter(pk=product_id).update(
+        review_count=F("review_count") + change,
+        latest_review_at=Subquery(latest),
+        last_update=timezone.now(),
+    )
+
+
+@receiver(post_save, sender=models.Product)
+@receiver(post_delete, sender=models.Product)
+@receiver(post_save, sender=models.Collection)
+@receiver(post_delete, sender=models.Collection)
+@receiver(post_save, sender=models.ProductImage)
+@receiver(post_delete, sender=models.ProductImage)
+@receiver(post_save, sender=models.Review)
+@receiver(post_delete, sender=models.Review)
+def invalidate_catalog_cache(sender, **kwargs):
+    cache.bump(sender)
+
+
+@outbox.handler("order_created")
+def count_related_products(payload):
+    related.record_order(payload["order_id"])
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import re
+import tempfile
+from django.apps import apps
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.deconstruct import deconstructible
+from store import imaging
+
+content_addressed_name = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$")
+
+
+def lock(name):
+    """Lock the StoredFile row of ``name`` until the transaction ends
+
+    Call inside transaction.atomic. Rows are deleted with what they guard,
+    so a waiter that finds its row gone creates it again.
+    """
+    StoredFile = apps.get_model("store", "StoredFile")
+    while True:
+        StoredFile.objects.bulk_create([StoredFile(name=name)], ignore_conflicts=True)
+        if StoredFile.objects.select_for_update().filter(name=name).first():
+            return
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """Stream uploads into a temporary file, hashing them on the way in"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Store each distinct file once, as ``<upload_to>/<sha[:2]>/<sha><ext>``
+
+    Saving content that is already stored returns the existing name, so
+    files are immutable and rows sharing a name share the file; delete a
+    file only once no row references it (see store.variants.release).
+    Saving locks the final name, save inside the transaction that writes
+    the referencing row.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # the final name is derived from the content in _save
+        return name
+
+    def is_content_addressed(self, name):
+        return bool(content_addressed_name.search(name))
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+
+        if hasattr(content, "temporary_file_path"):
+            source = content.temporary_file_path()
+            digest = getattr(content, "sha256", None) or imaging.file_digest(source)
+            final_name, full_path = self.final_path(directory, digest, extension)
+            lock(final_name)
+            if not os.path.exists(full_path):
+                file_move_safe(source, full_path, allow_overwrite=True)
+        else:
+            os.makedirs(self.location, exist_ok=True)
+            digest = hashlib.sha256()
+            with tempfile.NamedTemporaryFile(
+                dir=self.location, suffix=".upload", delete=False
+            ) as partial:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    partial.write(chunk)
+            final_name, full_path = self.final_path(
+                directory, digest.hexdigest(), extension
+            )
+            lock(final_name)
+            if os.path.exists(full_path):
+                os.remove(partial.name)
+            else:
+                os.replace(partial.name, full_path)
+
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return final_name
+
+    def final_path(self, directory, digest, extension):
+        name = "/".join(filter(None, [directory, digest[:2], digest + extension]))
+        full_path = self.path(name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        return name, full_path
+
+
+image_storage = ContentAddressedStorage()
@@ -1,3 +1,759 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from decimal import Decimal
+from datetime import timedelta
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as django_cache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from store import models, cache, carts, checks, flashsale, orders, outbox, related
+from store import serializers, variants
 
-# Create your tests here.
+
+def make_user(username="buyer"):
+    return get_user_model().objects.create_user(
+        username, f"{username}@example.com", "secret"
+    )
+
+
+def make_collection(title="Fruit"):
+    return models.Collection.objects.create(title=title)
+
+
+def make_product(collection, **fields):
+    fields = {
+        "title": "Pear",
+        "slug": "pear",
+        "description": "A pear",
+        "price": 10,
+        "inventory": 10,
+        **fields,
+    }
+    return models.Product.objects.create(collection=collection, **fields)
+
+
+def make_image(product, content=b"GIF89a\x01\x00\x01\x00\x00\x00\x00;"):
+    # a 1x1 GIF by default, equal content is stored once
+    return models.ProductImage.objects.create(
+        product=product, image=SimpleUploadedFile("pear.gif", content)
+    )
+
+
+def use_temporary_media(test):
+    media = tempfile.TemporaryDirectory()
+    test.addCleanup(media.cleanup)
+    override = override_settings(MEDIA_ROOT=media.name)
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+class ProductCountTests(TestCase):
+    """The triggers behind Collection.product_count survive every migration"""
+
+    def count(self, collection):
+        collection.refresh_from_db(fields=["product_count"])
+        return collection.product_count
+
+    def test_counts_follow_product_writes(self):
+        fruit, vegetables = make_collection(), make_collection("Vegetables")
+        pear = make_product(fruit)
+        make_product(fruit, title="Apple", slug="apple")
+        self.assertEqual(self.count(fruit), 2)
+
+        pear.collection = vegetables
+        pear.save()
+        self.assertEqual((self.count(fruit), self.count(vegetables)), (1, 1))
+
+        pear.delete()
+        self.assertEqual((self.count(fruit), self.count(vegetables)), (1, 0))
+
+
+class ProductSaveTests(TestCase):
+    def test_save_keeps_maintained_values(self):
+        pear = make_product(make_collection())
+        models.Product.objects.filter(pk=pear.pk).update(
+            popularity=7.5, effective_price=99, review_count=3
+        )
+        pear.title = "Green pear"
+        pear.save()
+
+        pear.refresh_from_db()
+        self.assertEqual(
+            (pear.title, pear.popularity, pear.review_count), ("Green pear", 7.5, 3)
+        )
+
+
+class ProductReadSerializerTests(TestCase):
+    def test_renders_the_same_bytes_as_product_serializer(self):
+        use_temporary_media(self)
+        collection = make_collection()
+        pear = make_product(collection, price="10.50")
+        apple = make_product(collection, title="Apple", slug="apple")
+        make_product(collection, title="Plum", slug="plum")
+        image = make_image(pear)
+        make_image(pear, content=b"GIF89a\x02\x00\x01\x00\x00\x00\x00;")
+        digest = "ab" * 32
+        os.makedirs(default_storage.path(variants.variant_directory(digest)))
+        variants.mark_ready({image.pk: digest})
+        models.Review.objects.create(product=pear, name="Sam", description="Ripe")
+        models.Product.objects.filter(pk=apple.pk).update(effective_price=None)
+
+        request = APIRequestFactory().get("/api/products/")
+        queryset = models.Product.objects.select_related("collection").order_by("id")
+        slow = serializers.ProductSerializer(
+            queryset, many=True, context={"request": request}
+        ).data
+        fast = serializers.ProductReadSerializer(
+            serializers.ProductReadSerializer.rows(queryset),
+            many=True,
+            context={"request": request},
+        ).data
+
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(slow))
+        self.assertEqual([len(product["images"]) for product in fast], [2, 0, 0])
+        self.assertIsNotNone(fast[0]["latest_review_at"])
+        self.assertIsNotNone(fast[0]["images"][0]["variants"])
+
+
+class BulkProductTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                "staff", "staff@example.com", "secret", is_staff=True
+            )
+        )
+        self.collection = make_collection()
+
+    def test_update_by_id_keeps_fields_it_was_not_given(self):
+        pear = make_product(self.collection, slug="p-2")
+        upsert = {
+            "id": pear.pk,
+            "title": "Green pear",
+            "description": "A pear",
+            "price": 12,
+            "inventory": 3,
+            "collection": self.collection.pk,
+        }
+        response = self.client.post(
+            "/api/products/bulk/", {"upserts": [upsert]}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        pear.refresh_from_db()
+        self.assertEqual((pear.title, pear.slug, pear.price), ("Green pear", "p-2", 12))
+
+    def test_update_by_id_needs_only_the_changed_fields(self):
+        pear = make_product(self.collection)
+        response = self.client.post(
+            "/api/products/bulk/",
+            {"upserts": [{"id": pear.pk, "inventory": 3}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        pear.refresh_from_db()
+        self.assertEqual((pear.title, pear.inventory), ("Pear", 3))
+
+    def test_create_needs_every_field(self):
+        response = self.client.post(
+            "/api/products/bulk/",
+            {"upserts": [{"title": "Pear", "price": 10}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            sorted(response.data["upserts"][0]),
+            ["collection", "description", "inventory"],
+        )
+
+
+class CatalogCacheTests(TestCase):
+    def test_generation_moves_when_the_write_commits(self):
+        pear = make_product(make_collection())
+        before = cache.generations([models.Product])
+        with self.captureOnCommitCallbacks(execute=True):
+            pear.title = "Green pear"
+            pear.save()
+            self.assertEqual(cache.generations([models.Product]), before)
+        self.assertNotEqual(cache.generations([models.Product]), before)
+
+    def test_process_local_cache_is_reported(self):
+        locmem = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        redis = {"BACKEND": "django.core.cache.backends.redis.RedisCache"}
+        with override_settings(CACHES={"default": locmem}):
+            warnings = checks.check_shared_cache(None)
+        self.assertEqual([warning.id for warning in warnings], ["store.W001"])
+        with override_settings(CACHES={"default": redis}):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.pear = make_product(make_collection())
+
+    def revalidate(self, etag):
+        response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        return response.status_code, response["ETag"]
+
+    def rename(self):
+        self.pear.title = f"Green {self.pear.title}"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pear.save()
+
+    def test_list_validators_from_the_database(self):
+        response = self.client.get("/api/products/")
+        self.assertIn("Last-Modified", response)
+        etag = response["ETag"]
+        self.assertEqual(self.revalidate(etag), (304, etag))
+
+        # no cache bump involved, another worker's write shows up too
+        models.Product.objects.filter(pk=self.pear.pk).update(
+            last_update=timezone.now() + timedelta(seconds=1)
+        )
+        self.assertEqual(self.revalidate(etag)[0], 200)
+
+    def test_list_validators_from_a_shared_cache(self):
+        with mock.patch.object(cache, "is_shared", return_value=True):
+            response = self.client.get("/api/products/")
+            self.assertIn("Last-Modified", response)
+            etag = response["ETag"]
+            with self.assertNumQueries(0):
+                self.assertEqual(self.revalidate(etag), (304, etag))
+
+            self.rename()
+            self.assertEqual(self.revalidate(etag)[0], 200)
+
+
+class KeysetPaginationTests(TestCase):
+    def walk(self, url, key):
+        pages = []
+        while url and len(pages) < 10:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([product["id"] for product in response.data["results"]])
+            url = response.data[key]
+        return pages, response
+
+    def test_pages_cover_products_without_effective_price(self):
+        collection = make_collection()
+        for price in [5, 20, 10, 20, 30]:
+            make_product(collection, title=str(price), slug=f"p-{price}", price=price)
+        # bulk writes leave effective_price empty until pricing.refresh
+        models.Product.objects.filter(price__gte=20).update(effective_price=None)
+        ids = sorted(models.Product.objects.values_list("pk", flat=True))
+
+        for ordering in ["effective_price", "-effective_price"]:
+            url = f"/api/products/?ordering={ordering}&cursor="
+            everything = self.client.get(f"{url}&page_size=10").data["results"]
+            expected = [product["id"] for product in everything]
+            self.assertEqual(sorted(expected), ids)
+
+            pages, last = self.walk(f"{url}&page_size=2", "next")
+            self.assertEqual(sum(pages, []), expected)
+            pages, _ = self.walk(last.data["previous"], "previous")
+            self.assertEqual(sum(reversed(pages), []), expected[:-1])
+
+    def test_search_pages_keep_relevance_order(self):
+        collection = make_collection()
+        for slug, description in [
+            ("a", "plain"),
+            ("b", "pear pear pear"),
+            ("c", "pear"),
+            ("d", "pear pear"),
+        ]:
+            make_product(collection, title=slug, slug=slug, description=description)
+
+        url = "/api/products/?search=pear"
+        ranked = [row["id"] for row in self.client.get(url).data["results"]]
+        pages, _ = self.walk(f"{url}&cursor=&page_size=1", "next")
+        self.assertEqual(sum(pages, []), ranked)
+        self.assertNotEqual(ranked, sorted(ranked))
+
+
+class ProductFacetsTests(TestCase):
+    def test_price_buckets_follow_effective_price(self):
+        collection = make_collection()
+        make_product(collection, price=10)
+        make_product(collection, title="Apple", slug="apple", price=30)
+        response = self.client.get(
+            "/api/products/", {"facets": "true", "price_buckets": "0,11,30"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [bucket["count"] for bucket in response.data["facets"]["price"]],
+            [0, 1, 1],
+        )
+
+    def test_non_finite_price_buckets_are_rejected(self):
+        for bounds in ["1,NaN", "1,Infinity", "-Infinity,1", "sNaN"]:
+            response = self.client.get(
+                "/api/products/", {"facets": "true", "price_buckets": bounds}
+            )
+            self.assertEqual(response.status_code, 400, bounds)
+
+
+class ImportCatalogTests(TestCase):
+    def run_import(self, suffix, content):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False) as feed:
+            feed.write(content)
+        self.addCleanup(os.remove, feed.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command("import_catalog", feed.name, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_bad_csv_rows_are_skipped(self):
+        stdout, stderr = self.run_import(
+            ".csv",
+            "slug,title,description,price,inventory,collection,promotions\n"
+            "pear,Pear,,10,5,Fruit,\n"
+            "apple,Apple,,10,5,Fruit,abc\n"
+            "melon,Melon,,10000,5,Fruit,\n"
+            "plum,Plum,,NaN,5,Fruit,\n",
+        )
+        self.assertIn("Created 1, updated 0, skipped 3", stdout)
+        self.assertIn("line 2", stderr)
+        self.assertEqual(
+            list(models.Product.objects.values_list("slug", flat=True)), ["pear"]
+        )
+
+    def test_bad_jsonl_lines_are_skipped(self):
+        pear = {
+            "slug": "pear",
+            "title": "Pear",
+            "price": 10,
+            "inventory": 5,
+            "collection": "Fruit",
+        }
+        stdout, _ = self.run_import(
+            ".jsonl", json.dumps(pear) + "\n{not json\n[1, 2]\n"
+        )
+        self.assertIn("Created 1, updated 0, skipped 2", stdout)
+
+
+class RelatedProductTests(TestCase):
+    def test_record_order_counts_every_pair(self):
+        collection = make_collection()
+        pear, apple, plum = (
+            make_product(collection, title=slug, slug=slug)
+            for slug in ["pear", "apple", "plum"]
+        )
+        customer = make_user().customer
+        for basket in [[pear, apple], [pear, apple, plum]]:
+            order = models.Order.objects.create(customer=customer)
+            models.OrderItem.objects.bulk_create(
+                models.OrderItem(order=order, product=product, quantity=1, unit_price=1)
+                for product in basket
+            )
+            related.record_order(order.pk)
+
+        self.assertEqual(
+            dict(
+                models.RelatedProduct.objects.filter(product=pear).values_list(
+                    "related_id", "orders"
+                )
+            ),
+            {apple.pk: 2, plum.pk: 1},
+        )
+
+
+class ImageReleaseTests(TestCase):
+    def setUp(self):
+        use_temporary_media(self)
+        self.product = make_product(make_collection())
+
+    def add_image(self):
+        return make_image(self.product)
+
+    def test_file_is_deleted_with_its_last_row(self):
+        first, second = self.add_image(), self.add_image()
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(models.StoredFile.objects.exists())
+
+
+class OrderTotalsTests(TestCase):
+    def place(self, placed_at=None):
+        order = models.Order.objects.create(customer=self.customer)
+        models.OrderItem.objects.create(
+            order=order, product=self.pear, quantity=2, unit_price="10.50"
+        )
+        if placed_at is not None:
+            models.Order.objects.filter(pk=order.pk).update(placed_at=placed_at)
+        return order
+
+    def test_refresh_tells_legacy_lines_apart(self):
+        self.pear = make_product(make_collection())
+        self.customer = make_user().customer
+        # placed before unit_price included tax
+        legacy = self.place(timezone.now() - timedelta(days=3650))
+        current = self.place()
+        orders.refresh([legacy.pk, current.pk])
+
+        legacy.refresh_from_db()
+        current.refresh_from_db()
+        self.assertEqual((legacy.subtotal, legacy.total), (21, 21))
+        self.assertEqual((current.subtotal, current.total), (Decimal("17.50"), 21))
+        self.assertEqual(current.item_count, 2)
+
+
+@override_settings(FLASH_SALE={"MAX_IN_FLIGHT": 2})
+class FlashSaleTests(TestCase):
+    def setUp(self):
+        collection = make_collection()
+        self.pear = make_product(collection, inventory=5, flash_sale=True)
+        self.apple = make_product(
+            collection, title="Apple", slug="apple", inventory=1, flash_sale=True
+        )
+        django_cache.clear()
+
+    def tokens(self, product):
+        return django_cache.get(flashsale.tokens_key(product.pk))
+
+    def test_admitted_checkout_keeps_its_tokens(self):
+        with flashsale.admit({self.pear.pk: 2}):
+            self.assertEqual(flashsale.state()["in_flight"], 1)
+        self.assertEqual(self.tokens(self.pear), 3)
+        self.assertEqual(flashsale.state()["in_flight"], 0)
+
+    def test_failed_checkout_returns_its_tokens(self):
+        with self.assertRaises(ValueError):
+            with flashsale.admit({self.pear.pk: 2}):
+                raise ValueError
+        self.assertEqual(self.tokens(self.pear), 5)
+
+    def test_sold_out_returns_the_other_lines(self):
+        with self.assertRaises(flashsale.Rejected) as rejected:
+            with flashsale.admit({self.pear.pk: 2, self.apple.pk: 2}):
+                pass
+        self.assertEqual(rejected.exception.reason, "sold out")
+        self.assertEqual((self.tokens(self.pear), self.tokens(self.apple)), (5, 1))
+        self.assertEqual(flashsale.state()["in_flight"], 0)
+
+    def test_no_free_slot_is_busy(self):
+        with flashsale.admit({self.pear.pk: 1}), flashsale.admit({self.pear.pk: 1}):
+            with self.assertRaises(flashsale.Rejected) as rejected:
+                with flashsale.admit({self.pear.pk: 1}):
+                    pass
+        self.assertEqual(rejected.exception.reason, "busy")
+        self.assertEqual(self.tokens(self.pear), 3)
+
+    def test_bulk_restock_reseeds_the_pool(self):
+        client = APIClient()
+        client.force_authenticate(
+            get_user_model().objects.create_user(
+                "staff", "staff@example.com", "secret", is_staff=True
+            )
+        )
+        with self.assertRaises(flashsale.Rejected):
+            with flashsale.admit({self.apple.pk: 2}):
+                pass
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(
+                "/api/products/bulk/",
+                {"upserts": [{"id": self.apple.pk, "inventory": 10}]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        with flashsale.admit({self.apple.pk: 2}):
+            pass
+        self.assertEqual(self.tokens(self.apple), 8)
+
+    def test_import_restock_reseeds_the_pool(self):
+        with flashsale.admit({self.apple.pk: 1}):
+            pass
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as feed:
+            feed.write("slug,title,price,inventory,collection\n")
+            feed.write("apple,Apple,10,4,Fruit\n")
+        self.addCleanup(os.remove, feed.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("import_catalog", feed.name, stdout=StringIO())
+        self.assertIsNone(self.tokens(self.apple))
+        with flashsale.admit({self.apple.pk: 4}):
+            pass
+
+
+@override_settings(OUTBOX={"MAX_ATTEMPTS": 2, "BACKOFF": 2, "LEASE": 60})
+class OutboxTests(TestCase):
+    topic = "test_event"
+
+    def setUp(self):
+        self.calls = []
+        self.failing = False
+
+        @outbox.handler(self.topic)
+        def record(payload):
+            if self.failing:
+                raise RuntimeError("handler failed")
+            self.calls.append(payload)
+
+        name = f"{record.__module__}.{record.__qualname__}"
+        self.addCleanup(outbox.handlers.pop, name)
+
+    def make_due(self):
+        models.OutboxEvent.objects.update(available_at=timezone.now())
+
+    def test_publish_joins_the_callers_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                outbox.publish(self.topic, {"n": 1})
+                raise RuntimeError
+        self.assertFalse(models.OutboxEvent.objects.exists())
+
+        with transaction.atomic():
+            outbox.publish(self.topic, {"n": 2})
+        self.assertEqual(outbox.process(), (list(models.OutboxEvent.objects.all()), 1))
+        self.assertEqual(self.calls, [{"n": 2}])
+        self.assertEqual(models.OutboxEvent.objects.get().status, outbox.DONE)
+
+    def test_failures_back_off_then_fail(self):
+        self.failing = True
+        outbox.publish(self.topic, {"n": 1})
+        before = timezone.now()
+        self.assertEqual(outbox.process()[1], 0)
+
+        event = models.OutboxEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), (outbox.PENDING, 1))
+        self.assertIn("handler failed", event.last_error)
+        self.assertGreaterEqual(event.available_at, before + timedelta(seconds=2))
+        self.assertEqual(outbox.process(), ([], 0))
+
+        self.make_due()
+        outbox.process()
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), (outbox.FAILED, 2))
+        self.assertIsNotNone(event.processed_at)
+
+    def test_expired_lease_is_claimed_again(self):
+        outbox.publish(self.topic, {"n": 1})
+        [stale] = outbox.claim()
+        self.assertEqual(outbox.claim(), [])
+
+        # the first worker died, its lease runs out
+        self.make_due()
+        [event] = outbox.claim()
+        self.assertNotEqual(event.claim, stale.claim)
+        self.assertEqual(event.attempts, 2)
+
+        # the late first worker can no longer settle the event
+        outbox.dispatch(stale)
+        self.assertEqual(models.OutboxEvent.objects.get().status, outbox.PENDING)
+        self.assertTrue(outbox.dispatch(event))
+        self.assertEqual(models.OutboxEvent.objects.get().status, outbox.DONE)
+
+
+class OrderHistoryTests(TestCase):
+    def test_history_runs_a_fixed_number_of_queries(self):
+        collection = make_collection()
+        products = [
+            make_product(collection, title=str(n), slug=f"p-{n}") for n in range(3)
+        ]
+        user = make_user()
+        # more than a page, the query count must not grow with either
+        for _ in range(12):
+            order = models.Order.objects.create(customer=user.customer)
+            models.OrderItem.objects.bulk_create(
+                models.OrderItem(order=order, product=product, quantity=1, unit_price=1)
+                for product in products
+            )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with self.assertNumQueries(2):
+            response = client.get("/api/orders/")
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(len(response.data["results"][0]["items"]), 3)
+        with self.assertNumQueries(3):
+            self.assertEqual(client.get("/api/orders/?count=true").data["count"], 12)
+
+
+class CartStorageTests:
+    """Run by one subclass per storage backend"""
+
+    storage_settings = None
+    writes_cart_rows = True
+
+    def setUp(self):
+        override = override_settings(CART_STORAGE=self.storage_settings)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.storage = carts.get_storage()
+
+        collection = make_collection()
+        self.pear = make_product(collection)
+        self.apple = make_product(collection, title="Apple", slug="apple")
+
+    def item(self, cart_id, product):
+        # item ids differ between storages, look the item up by product
+        return next(
+            item
+            for item in self.storage.items(cart_id)
+            if item.product_id == product.pk
+        )
+
+    def quantities(self, cart_id):
+        return {item.product_id: item.quantity for item in self.storage.items(cart_id)}
+
+    def test_add_merges_quantities(self):
+        cart = self.storage.create()
+        self.storage.add_items(cart.id, {self.pear.pk: 2})
+        self.storage.add_items(cart.id, {self.pear.pk: 3, self.apple.pk: 1})
+        self.assertEqual(self.quantities(cart.id), {self.pear.pk: 5, self.apple.pk: 1})
+        self.assertEqual(self.storage.get(cart.id).total_price, 72)
+
+    def test_unknown_cart_and_products(self):
+        cart = self.storage.create()
+        with self.assertRaises(carts.UnknownProducts):
+            self.storage.add_items(cart.id, {self.pear.pk: 1, 0: 1})
+        self.assertEqual(self.quantities(cart.id), {})
+        with self.assertRaises(carts.CartNotFound):
+            self.storage.add_items("00000000-0000-0000-0000-000000000000", {1: 1})
+
+    def test_update_and_delete_items(self):
+        cart = self.storage.create()
+        self.storage.add_items(cart.id, {self.pear.pk: 2, self.apple.pk: 1})
+        self.storage.update_item(self.item(cart.id, self.pear), 7)
+        self.storage.delete_item(self.item(cart.id, self.apple))
+        self.assertEqual(self.quantities(cart.id), {self.pear.pk: 7})
+
+        self.assertTrue(self.storage.delete(cart.id))
+        self.assertIsNone(self.storage.get(cart.id))
+
+    def test_item_total_follows_quantity(self):
+        cart = self.storage.create()
+        self.storage.add_items(cart.id, {self.pear.pk: 2})
+        item = self.storage.update_item(self.item(cart.id, self.pear), 9)
+        self.assertEqual(serializers.CartItemSerializer(item).data["total_price"], 108)
+
+        del item.total_price
+        self.assertEqual(serializers.CartItemSerializer(item).data["total_price"], 108)
+
+    def test_empty_batch_is_rejected(self):
+        client = APIClient()
+        cart_id = client.post("/api/carts/", {}, format="json").data["id"]
+        response = client.post(f"/api/carts/{cart_id}/items/batch/", [], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.storage.add_items(cart_id, {}), [])
+
+    def test_patch_and_browse_items(self):
+        client = APIClient()
+        cart_id = client.post("/api/carts/", {}, format="json").data["id"]
+        url = f"/api/carts/{cart_id}/items/"
+        item = client.post(
+            url, {"product_id": self.pear.pk, "quantity": 2}, format="json"
+        ).data
+
+        response = client.patch(f"{url}{item['id']}/", {"quantity": 9}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(cart_id), {self.pear.pk: 9})
+        self.assertEqual(client.get(url, HTTP_ACCEPT="text/html").status_code, 200)
+
+    def test_checkout(self):
+        # the key-value storage must not touch the cart tables before checkout
+        client = APIClient()
+        client.force_authenticate(make_user())
+        cart_id = client.post("/api/carts/", {}, format="json").data["id"]
+        client.post(
+            f"/api/carts/{cart_id}/items/batch/",
+            [
+                {"product_id": self.pear.pk, "quantity": 2},
+                {"product_id": self.apple.pk, "quantity": 1},
+            ],
+            format="json",
+        )
+        self.assertEqual(models.CartItem.objects.exists(), self.writes_cart_rows)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/orders/", {"cart_id": cart_id}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(
+                (item["product"]["id"], item["quantity"])
+                for item in response.data["items"]
+            ),
+            [(self.pear.pk, 2), (self.apple.pk, 1)],
+        )
+        self.assertIsNone(self.storage.get(cart_id))
+        self.assertFalse(models.Cart.objects.exists())
+
+
+class DatabaseCartStorageTests(CartStorageTests, TestCase):
+    storage_settings = {"BACKEND": "store.carts.DatabaseCartStorage"}
+
+
+class KeyValueCartStorageTests(CartStorageTests, TestCase):
+    storage_settings = {
+        "BACKEND": "store.carts.KeyValueCartStorage",
+        "OPTIONS": {"client": "store.carts.LocalKeyValueStore"},
+    }
+    writes_cart_rows = False
+
+
+class InventoryReservationTests(TransactionTestCase):
+    """Parallel checkouts of the same products never sell more than the stock"""
+
+    buyers = 12
+    stock = 5
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            # shared-cache memory databases fail concurrent writers at once
+            self.skipTest("needs a database that lets writers wait for locks")
+
+    def test_parallel_checkouts_do_not_oversell(self):
+        collection = make_collection()
+        pear = make_product(collection, inventory=self.stock)
+        apple = make_product(collection, title="Apple", slug="apple", inventory=50)
+        storage = carts.get_storage()
+
+        checkouts = []
+        for index in range(self.buyers):
+            cart = storage.create()
+            storage.add_items(cart.id, {pear.pk: 1, apple.pk: 2})
+            checkouts.append((make_user(f"buyer{index}"), cart.id))
+
+        def checkout(user, cart_id):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                return client.post(
+                    "/api/orders/", {"cart_id": cart_id}, format="json"
+                ).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.buyers) as pool:
+            statuses = list(pool.map(checkout, *zip(*checkouts)))
+
+        sold = dict(
+            models.OrderItem.objects.values_list("product_id")
+            .order_by("product_id")
+            .annotate(Sum("quantity"))
+        )
+        pear.refresh_from_db()
+        apple.refresh_from_db()
+        self.assertEqual(statuses.count(200), sold[pear.pk])
+        self.assertEqual(sold[pear.pk] + pear.inventory, self.stock)
+        self.assertEqual(sold[apple.pk] + apple.inventory, 50)
+        self.assertEqual(sold[apple.pk], 2 * sold[pear.pk])
+        self.assertEqual(statuses.count(200), self.stock)
+        self.assertEqual(statuses.count(400), self.buyers - self.stock)
@@ -0,0 +1,57 @@
+"""Insert-or-add upserts in one statement, for counters bumped concurrently
+
+``add`` inserts rows of ``(*key, amount)`` and, where a row with that key
+already exists, adds ``amount`` to its counter column instead. There is no
+read between the check and the write, so concurrent callers never lose an
+increment the way a read, update, then insert does.
+"""
+
+from django.db import connection
+
+
+def add(table, key, column, rows, joins=(), returning=None):
+    """Upsert ``rows`` into ``table``, returns the ``returning`` columns or None
+
+    ``joins`` are SQL JOIN clauses against the ``source`` rows, rows they
+    filter out are not written. ``returning`` is only honoured where the
+    database can return rows from an INSERT, callers read them back
+    otherwise.
+    """
+    if not rows:
+        return []
+    columns = [*key, column]
+    values = " UNION ALL ".join(
+        ["SELECT " + ", ".join(f"%s AS {name}" for name in columns)] * len(rows)
+    )
+    insert = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT {', '.join(f'source.{name}' for name in columns)} "
+        f"FROM ({values}) source {' '.join(joins)} "
+        # WHERE keeps SQLite from reading ON CONFLICT as a join constraint
+        "WHERE 1 = 1 "
+    )
+    params = [value for row in rows for value in row]
+    returning = (
+        returning
+        if connection.vendor != "mysql"
+        and connection.features.can_return_rows_from_bulk_insert
+        else None
+    )
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            cursor.execute(
+                insert + f"ON DUPLICATE KEY UPDATE "
+                f"{column} = {table}.{column} + source.{column}",
+                params,
+            )
+        else:
+            cursor.execute(
+                insert + f"ON CONFLICT ({', '.join(key)}) DO UPDATE "
+                f"SET {column} = {table}.{column} + excluded.{column}"
+                + (f" RETURNING {', '.join(returning)}" if returning else ""),
+                params,
+            )
+        if returning:
+            return cursor.fetchall()
+    return None
@@ -5,7 +5,7 @@ from store import views
 router = routers.DefaultRouter()
 router.register("products", views.ProductViewSet)
 router.register("collections", views.CollectionViewSet)
-router.register("carts", views.CartViewSet)
+router.register("carts", views.CartViewSet, "cart")
 router.register("customers", views.CustomerViewSet)
 router.register("orders", views.OrderViewSet, "orders")
 
@@ -13,6 +13,9 @@ router.register("orders", views.OrderViewSet, "orders")
 products_router = routers.NestedDefaultRouter(router, "products", lookup="product")
 products_router.register("reviews", views.ReviewViewSet, basename="product-reviews")
 products_router.register("images", views.ProductImageViewSet, basename="product-images")
+products_router.register(
+    "related", views.RelatedProductViewSet, basename="product-related"
+)
 
 carts_router = routers.NestedDefaultRouter(router, "carts", lookup="cart")
 carts_router.register("items", views.CartItemViewSet, basename="cart-items")
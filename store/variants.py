@@ -0,0 +1,127 @@
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from store import models, imaging, cache, storage
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, "IMAGE_VARIANT_WORKERS", 2)
+            )
+        return _executor
+
+
+def variant_urls(digest, request=None):
+    """``{"200": {"webp": url, "jpeg": url}, ...}`` or None until rendered"""
+    if not digest:
+        return None
+    urls = {}
+    for width in imaging.WIDTHS:
+        urls[str(width)] = {}
+        for format in imaging.FORMATS:
+            url = default_storage.url(imaging.variant_name(digest, width, format))
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[str(width)][format] = url
+    return urls
+
+
+def variant_directory(digest):
+    return os.path.dirname(imaging.variant_name(digest, 0, ""))
+
+
+@transaction.atomic
+def mark_ready(digests):
+    """Record rendered variants given ``{image_id: digest}``
+
+    Variants released while they were rendering stay not ready, for the
+    next generate_image_variants run.
+    """
+    directories = {variant_directory(digest) for digest in digests.values()}
+    for directory in sorted(directories):
+        storage.lock(directory)
+    digests = {
+        image_id: digest
+        for image_id, digest in digests.items()
+        if os.path.isdir(default_storage.path(variant_directory(digest)))
+    }
+    images = []
+    for image_id, digest in digests.items():
+        images.append(
+            models.ProductImage(pk=image_id, digest=digest, variants_ready=True)
+        )
+    models.ProductImage.objects.bulk_update(images, ["digest", "variants_ready"])
+    models.Product.objects.filter(images__in=digests.keys()).update(
+        last_update=timezone.now()
+    )
+    cache.bump(models.ProductImage)
+
+
+def _finished(image_id, future):
+    def record():
+        try:
+            mark_ready({image_id: future.result()})
+        except Exception:
+            logger.exception("Rendering variants of ProductImage %s failed", image_id)
+        finally:
+            connection.close()
+
+    # done callbacks run on the pool's thread, use our own for the DB work
+    threading.Thread(target=record, daemon=True).start()
+
+
+def submit(image):
+    global _executor
+    try:
+        future = get_executor().submit(
+            imaging.render, image.image.path, str(settings.MEDIA_ROOT)
+        )
+    except BrokenProcessPool:
+        with _executor_lock:
+            _executor = None
+        future = get_executor().submit(
+            imaging.render, image.image.path, str(settings.MEDIA_ROOT)
+        )
+    future.add_done_callback(lambda future: _finished(image.pk, future))
+
+
+def schedule(image):
+    """Render the variants of ``image`` in the pool once the upload commits"""
+    transaction.on_commit(lambda: submit(image))
+
+
+def release(name, digest):
+    """Delete an image file and its variants once no row references them
+
+    Each check and delete runs under the lock that storing the file and
+    mark_ready take, so no row starts referencing them in between.
+    """
+    images = models.ProductImage.objects
+    if name:
+        with transaction.atomic():
+            storage.lock(name)
+            if not images.filter(image=name).exists():
+                images.model._meta.get_field("image").storage.delete(name)
+                models.StoredFile.objects.filter(name=name).delete()
+    if digest:
+        directory = variant_directory(digest)
+        with transaction.atomic():
+            storage.lock(directory)
+            if not images.filter(digest=digest).exists():
+                shutil.rmtree(default_storage.path(directory), ignore_errors=True)
+                models.StoredFile.objects.filter(name=directory).delete()
@@ -1,26 +1,93 @@
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
-from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin
+from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, ListModelMixin
 from rest_framework.mixins import DestroyModelMixin, UpdateModelMixin
 from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework import exceptions, status
+from rest_framework.filters import OrderingFilter
 from rest_framework.decorators import action
 from rest_framework import permissions
-from django.db.models import Count
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
+from django_filters import utils
 from django_filters.rest_framework import DjangoFilterBackend
-from store import models, serializers, filters, pagination
+from store import models, serializers, filters, pagination, feeds, carts, flashsale
+from store.cache import CachedResponseMixin, ConditionalGetMixin
 from store.permissions import IsAdminOrReadOnly
 
 
-class ProductViewSet(ModelViewSet):
-    queryset = models.Product.objects.select_related("collection").all()
+class ProductViewSet(
+    ConditionalGetMixin, CachedResponseMixin, filters.FacetsMixin, ModelViewSet
+):
+    queryset = (
+        models.Product.objects.select_related("collection")
+        .prefetch_related("images")
+        .all()
+    )
     serializer_class = serializers.ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
     pagination_class = pagination.ProductPagination
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.ProductSearchFilter, OrderingFilter]
     filterset_class = filters.ProductFilter
-    search_fields = ["title"]
-    ordering_fields = ["price"]
+    search_fields = ["title", "description"]
+    ordering_fields = ["price", "effective_price", "popularity"]
+    cache_models = [
+        models.Product,
+        models.Collection,
+        models.ProductImage,
+        models.Review,
+    ]
+    last_modified_fields = ["last_update", "collection__last_update"]
+
+    def get_serializer_class(self):
+        if self.action == "bulk":
+            return serializers.BulkProductSerializer
+        if self.request.method == "GET":
+            return serializers.ProductReadSerializer
+        return serializers.ProductSerializer
+
+    def get_queryset(self):
+        if self.request.method == "GET":
+            return serializers.ProductReadSerializer.rows(self.queryset)
+        return super().get_queryset()
+
+    def get_validator_queryset(self):
+        if self.action == "list" and self.facets_class.requested(self.request):
+            return self.facets_class(self.request, self).base_queryset()
+        return super().get_validator_queryset()
+
+    @action(detail=False, methods=["GET"])
+    def feed(self, request):
+        """Every product matching ProductFilter as NDJSON, or a JSON array
+        with ``?array=true``, streamed in id order"""
+        filterset = filters.ProductFilter(
+            request.query_params,
+            queryset=self.queryset.order_by("id"),
+            request=request,
+        )
+        if not filterset.is_valid():
+            raise utils.translate_validation(filterset.errors)
+
+        array = request.query_params.get("array", "").lower() in ("1", "true", "yes")
+        return feeds.product_feed(request, filterset.qs, array=array)
+
+    @action(detail=False, methods=["POST"])
+    def bulk(self, request):
+        """Upsert, reprice and delete many products in one transaction,
+        nothing is written unless every item is valid"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
+
+    @action(
+        detail=False,
+        methods=["GET"],
+        url_path="flash-sale",
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def flash_sale(self, request):
+        """Token pools and admission counters of the running flash sales"""
+        return Response(flashsale.state())
 
     def destroy(self, request, *args, **kwargs):
         if models.OrderItem.objects.filter(product_id=kwargs["pk"]).count() > 0:
@@ -31,11 +98,12 @@ class ProductViewSet(ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class CollectionViewSet(ModelViewSet):
-    queryset = models.Collection.objects.annotate(product_count=Count("product")).all()
+class CollectionViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
+    queryset = models.Collection.objects.all()
     serializer_class = serializers.CollectionSerializer
     permission_classes = [IsAdminOrReadOnly]
     pagination_class = pagination.CollectionPagination
+    cache_models = [models.Collection, models.Product]
 
     def destroy(self, request, *args, **kwargs):
         if models.Product.objects.filter(collection_id=kwargs["pk"]).count() > 0:
@@ -46,24 +114,61 @@ class CollectionViewSet(ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(CachedResponseMixin, ModelViewSet):
     serializer_class = serializers.ReviewSerializer
+    pagination_class = pagination.ReviewPagination
+    cache_models = [models.Review, models.Product]
 
     def get_queryset(self):
-        return models.Review.objects.filter(
-            product_id=self.kwargs["product_pk"]
-        ).select_related("product")
+        return models.Review.objects.filter(product_id=self.kwargs["product_pk"])
 
     def get_serializer_context(self):
-        return {"product_id": self.kwargs["product_pk"]}
+        product_name = (
+            models.Product.objects.filter(pk=self.kwargs["product_pk"])
+            .values_list("title", flat=True)
+            .first()
+        )
+        return {"product_id": self.kwargs["product_pk"], "product_name": product_name}
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
+
+class RelatedProductViewSet(CachedResponseMixin, ListModelMixin, GenericViewSet):
+    serializer_class = serializers.RelatedProductSerializer
+    cache_models = [models.RelatedProduct, models.Product]
+
+    def get_queryset(self):
+        return (
+            models.RelatedProduct.objects.filter(product_id=self.kwargs["product_pk"])
+            .select_related("related")
+            .order_by("-orders", "related_id")
+        )
 
 
 class CartViewSet(
     CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet
 ):
-    queryset = models.Cart.objects.prefetch_related("items__product").all()
     serializer_class = serializers.CartSerializer
 
+    def get_object(self):
+        cart = carts.get_storage().get(self.kwargs["pk"])
+        if cart is None:
+            raise Http404
+        return cart
+
+    def perform_destroy(self, cart):
+        carts.get_storage().delete(cart.pk)
+
+    @action(detail=True, methods=["GET"])
+    def summary(self, request, pk=None):
+        """Item count and total from one aggregate query, items are not loaded"""
+        summary = carts.get_storage().summary(pk)
+        if summary is None:
+            raise Http404
+        return Response(serializers.CartSummarySerializer(summary).data)
+
 
 class CartItemViewSet(ModelViewSet):
 
@@ -71,15 +176,38 @@ class CartItemViewSet(ModelViewSet):
         if self.request.method == "POST":
             return serializers.AddCartItemSerializer
 
-        elif self.request.method == "PUT":
+        elif self.request.method in ["PUT", "PATCH"]:
             return serializers.UpdateCartItemSerializer
 
         return serializers.CartItemSerializer
 
     def get_queryset(self):
-        return models.CartItem.objects.filter(
-            cart_id=self.kwargs["cart_pk"]
-        ).select_related("product")
+        # items come from the cart storage, this only serves the browsable API
+        return models.CartItem.objects.none()
+
+    @action(detail=False, methods=["POST"])
+    def batch(self, request, cart_pk=None):
+        """Add a list of ``{product_id, quantity}`` in one statement, nothing
+        is added unless every product exists"""
+        serializer = self.get_serializer(
+            data=request.data, many=True, allow_empty=False
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def list(self, request, *args, **kwargs):
+        items = carts.get_storage().items(self.kwargs["cart_pk"])
+        return Response(self.get_serializer(items, many=True).data)
+
+    def get_object(self):
+        item = carts.get_storage().get_item(self.kwargs["cart_pk"], self.kwargs["pk"])
+        if item is None:
+            raise Http404
+        return item
+
+    def perform_destroy(self, item):
+        carts.get_storage().delete_item(item)
 
     def get_serializer_context(self):
         return {"cart_id": self.kwargs["cart_pk"]}
@@ -110,6 +238,10 @@ class CustomerViewSet(ModelViewSet):
 
 
 class OrderViewSet(ModelViewSet):
+    pagination_class = pagination.OrderPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = filters.OrderFilter
+
     def get_permissions(self):
         if self.request.method in ["PUT", "PATCH", "DELETE"]:
             return [permissions.IsAdminUser()]
@@ -120,7 +252,13 @@ class OrderViewSet(ModelViewSet):
             data=request.data, context={"user_id": self.request.user.id}
         )
         serializer.is_valid(raise_exception=True)
-        order = serializer.save()
+        try:
+            with flashsale.admit(flashsale.sale_lines(serializer.cart.cart_items)):
+                order = serializer.save()
+        except flashsale.Rejected as error:
+            raise exceptions.Throttled(
+                error.retry_after, f"Checkout is {error.reason}, try again later."
+            )
         serializer = serializers.OrderSerializer(order)
         return Response(serializer.data)
 
@@ -135,16 +273,18 @@ class OrderViewSet(ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        queryset = models.Order.objects.prefetch_related(
+            Prefetch("items", models.OrderItem.objects.order_by("pk"))
+        )
 
         if user.is_staff:
-            return models.Order.objects.prefetch_related("items")
-
-        customer = models.Customer.objects.only("id").get(user_id=user.id)
-        return models.Order.objects.filter(customer_id=customer)
+            return queryset
+        return queryset.filter(customer__user_id=user.id)
 
 
-class ProductImageViewSet(ModelViewSet):
+class ProductImageViewSet(CachedResponseMixin, ModelViewSet):
     serializer_class = serializers.ProductImageSerializer
+    cache_models = [models.ProductImage, models.Product]
 
     def get_queryset(self):
         return models.ProductImage.objects.filter(
@@ -135,6 +135,32 @@ STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# processes rendering product image variants outside the request cycle
+IMAGE_VARIANT_WORKERS = 2
+
+# shared by every worker: the catalog response cache and its generation
+# counters (store.cache) and the flash-sale pools (store.flashsale) break
+# with a per-process cache such as LocMemCache, see the store.W001 check
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/1",
+    }
+}
+
+# where carts live until checkout, see store.carts for the key-value option
+CART_STORAGE = {"BACKEND": "store.carts.DatabaseCartStorage"}
+# seconds a cart may stay idle, see the reap_carts command
+CART_TTL = 60 * 60 * 24 * 7
+
+# admission of checkouts for products with flash_sale set, see store.flashsale
+FLASH_SALE = {"MAX_IN_FLIGHT": 8, "RETRY_AFTER": 1, "SOLD_OUT_RETRY_AFTER": 30}
+# delivery of store.outbox events by the run_outbox command, times in seconds
+OUTBOX = {"MAX_ATTEMPTS": 8, "BACKOFF": 2, "MAX_BACKOFF": 60 * 60, "LEASE": 60 * 5}
+
+# stream uploads to disk, hashing them for store.storage
+FILE_UPLOAD_HANDLERS = ["store.storage.HashingUploadHandler"]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 